@@ -4,14 +4,32 @@ Improved fund data fetcher script
 Called by Web application, returns standardized CSV format data
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
-import json
+import os
+import math
+import pickle
+import functools
+import tempfile
+import time
 import pandas as pd
 import sys
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import io
 
+try:
+    import orjson as _json  # Optional, parses the large JSONP pages much faster
+except ImportError:
+    import json as _json
+
+PAGE_SIZE = 20
+_JSONP_RE = re.compile(rb'jQuery.+?\((.*)\)', re.DOTALL)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fund_cache')
+CACHE_TTL = 10 * 60  # seconds; NAVs published later in the day are picked up after this
+
 def safe_print(*args):
     """Safe print function to handle Windows encoding issues"""
     try:
@@ -23,20 +41,92 @@ def safe_print(*args):
     except Exception:
         print("Print error", file=sys.stderr)
 
+def daily_cache(kind):
+    """
+    Cache a fetcher method's result on disk for CACHE_TTL seconds.
+    Pages are also keyed by date because new NAVs are pushed onto page 1 every
+    trading day, shifting every older page.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            if not self.use_cache:
+                return method(self, *args)
+            key = '_'.join([self.cache_key, kind, *map(str, args), datetime.now().strftime('%Y%m%d')])
+            path = os.path.join(CACHE_DIR, key + '.pkl')
+            try:
+                if time.time() - os.path.getmtime(path) < CACHE_TTL:
+                    with open(path, 'rb') as f:
+                        return pickle.load(f)
+            except OSError:
+                pass
+            except Exception as e:
+                # Any unreadable entry (truncated, written by another pandas version, ...) is a miss
+                safe_print(f"Discarding bad cache {key}: {e}")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+            result = method(self, *args)
+            if result is not None:
+                try:
+                    os.makedirs(CACHE_DIR, exist_ok=True)
+                    # Write to a unique temporary file first so concurrent readers never see a
+                    # partial file and concurrent writers (threads or processes) never share one
+                    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            pickle.dump(result, f)
+                        os.replace(tmp_path, path)
+                    except BaseException:
+                        os.remove(tmp_path)
+                        raise
+                except OSError as e:
+                    safe_print(f"Cannot write cache {key}: {e}")
+            return result
+        return wrapper
+    return decorator
+
 class FundDataFetcher:
-    def __init__(self, fund_code: str):
+    def __init__(self, fund_code: str, use_cache: bool = True):
         """
         :param fund_code: Fund code (string format)
+        :param use_cache: Reuse responses cached on disk within the last CACHE_TTL seconds
         """
         self.root_url = 'http://api.fund.eastmoney.com/f10/lsjz'
         self.fund_code = fund_code
+        self.use_cache = use_cache
+        self.cache_key = re.sub(r'[^\w-]', '_', str(fund_code))
+        if use_cache:
+            self._prune_cache()
         self.session = requests.session()
+        # Keep sockets alive across the paged requests; the pool must be at
+        # least as large as the fetch batch so concurrent pages reuse connections
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.headers = {
             'Host': 'api.fund.eastmoney.com',
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': f'http://fundf10.eastmoney.com/jjjz_{self.fund_code}.html',
         }
 
+    def _prune_cache(self):
+        """Remove this fund's cache entries from previous days"""
+        today_suffix = datetime.now().strftime('%Y%m%d') + '.pkl'
+        try:
+            for name in os.listdir(CACHE_DIR):
+                if name.startswith(self.cache_key + '_') and not name.endswith(today_suffix):
+                    os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
+
+    @daily_cache('info')
     def get_fund_info(self):
         """Get fund basic information"""
         search_url = 'https://fundsuggest.eastmoney.com/FundSearch/api/FundSearchAPI.ashx'
@@ -47,7 +137,7 @@ class FundDataFetcher:
         }
         try:
             res = self.session.get(search_url, params=params, timeout=10)
-            content = self._format_content(res.text)
+            content = self._format_content(res.content)
             if content and 'Datas' in content and len(content['Datas']) > 0:
                 fund_data = content['Datas'][0]
                 return {
@@ -61,55 +151,75 @@ class FundDataFetcher:
 
     @staticmethod
     def _format_content(content):
-        """Format return content"""
+        """Format return content (raw response bytes)"""
         try:
-            params = re.compile(r'jQuery.+?\((.*)\)')
-            matches = params.findall(content)
-            if matches:
-                return json.loads(matches[0])
+            match = _JSONP_RE.search(content)
+            if match:
+                return _json.loads(match.group(1))
         except Exception:
             pass
         return None
 
+    @daily_cache('page')
     def get_page_data(self, page_index):
         """Get data for specified page"""
         params = {
             'callback': 'jQuery18308909743577296265_1618718938738',
             'fundCode': self.fund_code,
             'pageIndex': page_index,
-            'pageSize': 20,
+            'pageSize': PAGE_SIZE,
         }
         try:
             res = self.session.get(url=self.root_url, headers=self.headers, params=params, timeout=10)
-            return self._format_content(res.text)
+            return self._format_content(res.content)
         except Exception as e:
             safe_print(f"Error getting page {page_index}: {e}")
             return None
 
-    def fetch_all_data(self, max_pages=50):
-        """Get all historical NAV data"""
-        all_data = []
-        page_index = 1
-        
-        while page_index <= max_pages:
-            page_data = self.get_page_data(page_index)
-            
-            if not page_data or 'Data' not in page_data:
-                break
-                
-            lsjz_list = page_data['Data'].get('LSJZList', [])
-            if not lsjz_list:
-                break
-                
-            all_data.extend(lsjz_list)
-            
-            # If this page has less than 20 records, it's the last page
-            if len(lsjz_list) < 20:
-                break
-                
-            page_index += 1
-            
-        return all_data
+    @staticmethod
+    def _page_records(page_data):
+        """Get the NAV records of a page, None if the page is missing or empty"""
+        if not page_data or 'Data' not in page_data:
+            return None
+        return page_data['Data'].get('LSJZList') or None
+
+    def fetch_all_data(self, max_pages=50, batch_size=8):
+        """Yield all historical NAV records, requesting pages concurrently"""
+        first_page = self.get_page_data(1)
+        records = self._page_records(first_page)
+        if not records:
+            return
+        yield from records
+        if len(records) < PAGE_SIZE:
+            return
+
+        # The first page reports the total record count, so all remaining pages
+        # can be dispatched at once instead of probing batches for the last page
+        try:
+            last_page = min(max_pages, math.ceil(int(first_page['TotalCount']) / PAGE_SIZE))
+            batches = [range(2, last_page + 1)]
+        except (KeyError, TypeError, ValueError):
+            batches = [range(start, min(start + batch_size, max_pages + 1))
+                       for start in range(2, max_pages + 1, batch_size)]
+
+        executor = ThreadPoolExecutor(max_workers=batch_size)
+        try:
+            for pages in batches:
+                # Results come back in page order
+                for page_data in executor.map(self.get_page_data, pages):
+                    records = self._page_records(page_data)
+                    if not records:
+                        return
+
+                    yield from records
+
+                    # If this page has less than PAGE_SIZE records, it's the last page
+                    if len(records) < PAGE_SIZE:
+                        return
+        finally:
+            # On an early return, drop the pages not yet requested instead of
+            # waiting for them like the executor's context manager would
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def process_data(self):
         """Process data and return standardized DataFrame"""
@@ -122,24 +232,18 @@ class FundDataFetcher:
         
         safe_print(f"Fund name: {fund_info['name']}")
         
-        # Get historical data
-        raw_data = self.fetch_all_data()
-        if not raw_data:
+        # Get historical data, streaming only the two needed fields into the DataFrame
+        result_df = pd.DataFrame.from_records(
+            ((record.get('FSRQ'), record.get('DWJZ')) for record in self.fetch_all_data()),
+            columns=['time', 'nav'],
+        )
+        if result_df.empty:
             raise ValueError(f"Cannot get fund {self.fund_code} historical data")
         
-        # Convert to DataFrame
-        df = pd.DataFrame(raw_data)
-        
         # Data cleaning and standardization
-        if 'FSRQ' in df.columns and 'DWJZ' in df.columns:
-            # Select needed columns
-            result_df = df[['FSRQ', 'DWJZ']].copy()
-            
-            # Rename columns to standard format
-            result_df.columns = ['time', 'nav']
-            
+        if result_df['time'].notna().any() and result_df['nav'].notna().any():
             # Convert data types
-            result_df['time'] = pd.to_datetime(result_df['time'])
+            result_df['time'] = pd.to_datetime(result_df['time'], format='%Y-%m-%d', cache=True)
             result_df['nav'] = pd.to_numeric(result_df['nav'], errors='coerce')
             
             # Remove invalid data
@@ -153,17 +257,34 @@ class FundDataFetcher:
         else:
             raise ValueError("Data format incorrect, missing required columns")
 
+def fetch(fund_code):
+    """
+    In-process entry point used by the Web application
+    :param fund_code: Fund code
+    :return: Standardized DataFrame with time and nav columns
+    """
+    return FundDataFetcher(str(fund_code)).process_data()
+
+def records_to_json(df):
+    """Serialize the standardized DataFrame as JSON records (UTF-8 bytes)"""
+    # Same ISO timestamp format as df.to_json(date_format='iso')
+    times = df['time'].dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3]
+    records = [{'time': t, 'nav': n} for t, n in zip(times.tolist(), df['nav'].tolist())]
+    payload = _json.dumps(records)
+    return payload if isinstance(payload, bytes) else payload.encode('utf-8')
+
 def main():
     """Main function - command line interface"""
     parser = argparse.ArgumentParser(description='Get fund historical NAV data')
     parser.add_argument('fund_code', help='Fund code')
     parser.add_argument('--output', '-o', help='Output file path (default output to stdout)')
     parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Output format')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore responses cached on disk')
     
     args = parser.parse_args()
     
     try:
-        fetcher = FundDataFetcher(args.fund_code)
+        fetcher = FundDataFetcher(args.fund_code, use_cache=not args.no_cache)
         df = fetcher.process_data()
         
         if args.format == 'csv':
@@ -175,11 +296,13 @@ def main():
                 csv_string = df.to_csv(index=False)
                 print(csv_string, end='')
         elif args.format == 'json':
+            payload = records_to_json(df)
             if args.output:
-                df.to_json(args.output, orient='records', date_format='iso')
+                with open(args.output, 'wb') as f:
+                    f.write(payload)
                 safe_print(f"Data saved to {args.output}")
             else:
-                print(df.to_json(orient='records', date_format='iso'))
+                sys.stdout.buffer.write(payload + b'\n')
                 
     except Exception as e:
         safe_print(f"Error: {e}")
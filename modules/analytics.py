@@ -2,20 +2,113 @@
 分析模块 - 处理时间序列对齐、投资指标计算、表格生成等功能
 """
 
+import functools
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 from dash import html
 from modules.config import COLORS
 
-# 安全的日志函数
-def safe_print(*args):
-    """安全的打印函数，避免Windows编码问题"""
-    try:
-        if __debug__:
-            message = ' '.join(str(arg) for arg in args)
-            safe_message = ''.join(c if ord(c) < 128 else '?' for c in message)
-            safe_print(safe_message[:200])
-    except:
-        pass
+# 调试日志，默认级别下不输出；参数以 %s 方式传入，只有启用 DEBUG 时才会格式化
+log = logging.getLogger(__name__)
+
+
+# --- 投资分析表格的表头与样式 ---
+# 样式字典在模块级构造一次，所有单元格共享，每次渲染只需构造行数据
+_TABLE_HEADERS = ("组合名称", "期间", "总收益率", "年化收益率", "年化波动率",
+                  "最大回撤", "夏普比率", "Calmar比率", "胜率", "VaR(95%)")
+
+_TABLE_STYLE = {
+    'width': '100%',
+    'borderCollapse': 'collapse',
+    'boxShadow': f'0 2px 8px {COLORS["shadow"]}',
+    'borderRadius': '8px',
+    'overflow': 'hidden'
+}
+
+_HEADER_STYLE = {
+    'padding': '12px',
+    'backgroundColor': COLORS['primary'],
+    'color': 'white',
+    'border': 'none',
+    'textAlign': 'center'
+}
+
+# 斑马纹背景设置在行上，单元格样式与行无关
+_ROW_STYLES = (
+    {'backgroundColor': COLORS['light'], 'textAlign': 'center'},
+    {'backgroundColor': COLORS['white'], 'textAlign': 'center'},
+)
+
+_CELL_STYLE = {'padding': '10px'}
+_NAME_CELL_STYLE = {'padding': '10px', 'fontWeight': '600'}
+_PERIOD_CELL_STYLE = {'padding': '10px', 'fontSize': '12px'}
+# 根据指标好坏着色的单元格样式：'success' / 'warning' / 'danger'
+_COLORED_CELL_STYLES = {
+    key: {'padding': '10px', 'color': COLORS[key], 'fontWeight': '600'}
+    for key in ('success', 'warning', 'danger')
+}
+
+_LEGEND_ITEM_STYLE = {'margin': '5px 0'}
+
+
+def _truncate(df, start_time):
+    """截取 start_time 及之后的数据，索引有序时直接按位置切片，避免构造布尔掩码"""
+    index = df.index
+    if index.is_monotonic_increasing:
+        return df.iloc[index.searchsorted(start_time, side='left'):]
+    return df[index >= start_time]
+
+
+def _normalize(df):
+    """
+    以第一个值为基准归一化单列基金数据
+    :param df: 单列基金数据
+    :return: 归一化后的数据，起始值为0时返回 None
+    """
+    values = df.to_numpy()
+    first_value = values[0, 0]
+    if first_value == 0:
+        return None
+    return pd.DataFrame(values / first_value, index=df.index, columns=df.columns)
+
+
+def _normalize_and_collect(fund_dfs, start_cutoff=None):
+    """
+    截取并归一化组合内的每只基金
+    :param fund_dfs: 基金数据列表，每项可带 'fund_id' 用于日志，否则使用列名
+    :param start_cutoff: 统一的开始时间，为 None 时不截取
+    :return: 归一化后的基金数据列表，跳过空数据和起始值为0的基金
+    """
+    normalized_fund_dfs = []
+    for fund in fund_dfs:
+        df = fund['df']
+        if df.empty:
+            continue
+        fund_id = fund.get('fund_id', df.columns[0])
+        
+        if start_cutoff is not None:
+            original_points = len(df)
+            df = _truncate(df, start_cutoff)
+            if df.empty:
+                continue
+            log.debug("%s: %d -> %d 个数据点 (对齐到 %.10s)", fund_id, original_points, len(df), start_cutoff)
+        
+        # 以（对齐后的）第一个值为基准进行归一化
+        normalized_df = _normalize(df)
+        if normalized_df is not None:
+            normalized_fund_dfs.append({
+                'df': normalized_df,
+                'share': fund['share']
+            })
+        else:
+            # 如果第一个值为0，跳过这个基金
+            log.debug("跳过基金 %s (起始值为0)", fund_id)
+    return normalized_fund_dfs
 
 
 def align_time_series_data(fund_dfs, portfolio_name):
@@ -28,206 +121,141 @@ def align_time_series_data(fund_dfs, portfolio_name):
     if not fund_dfs:
         return fund_dfs, None
     
-    # 收集所有基金的时间范围信息
-    time_info = []
-    for fund in fund_dfs:
-        df = fund['df']
-        if not df.empty:
-            start_time = df.index.min()
-            end_time = df.index.max()
-            fund_id = df.columns[0]
-            time_info.append({
-                'fund_id': fund_id,
-                'start_time': start_time,
-                'end_time': end_time,
-                'data_points': len(df)
-            })
-    
-    if not time_info:
+    # 一次遍历收集所有基金的起止时间
+    non_empty_dfs = [fund['df'] for fund in fund_dfs if not fund['df'].empty]
+    if not non_empty_dfs:
         return fund_dfs, None
+    start_times = pd.DatetimeIndex([df.index.min() for df in non_empty_dfs])
+    end_times = pd.DatetimeIndex([df.index.max() for df in non_empty_dfs])
     
     # 找到最晚的开始时间（组合内最晚发售的基金）
-    latest_start = max(info['start_time'] for info in time_info)
-    earliest_end = min(info['end_time'] for info in time_info)
+    latest_start = start_times.max()
+    earliest_end = end_times.min()
     
     # 检查是否需要对齐
-    needs_alignment = any(info['start_time'] < latest_start for info in time_info)
+    needs_alignment = bool((start_times < latest_start).any())
     
     if needs_alignment:
-        try:
-            date_str = latest_start.strftime('%Y-%m-%d')
-            safe_print("组合 '{}' 检测到时间不统一，正在对齐到组合内最晚发售基金的开始时间: {}".format(portfolio_name, date_str))
-        except Exception:
-            safe_print("组合检测到时间不统一，正在对齐")
-        
-        # 对齐所有基金数据到统一时间区间（从最晚发售的基金开始）
-        aligned_fund_dfs = []
-        for fund in fund_dfs:
-            df = fund['df']
-            if not df.empty:
-                # 截取到统一的时间区间（从组合内最晚发售基金开始）
-                aligned_df = df[df.index >= latest_start]
-                if not aligned_df.empty:
-                    aligned_fund_dfs.append({
-                        'df': aligned_df,
-                        'share': fund['share']
-                    })
-                    
-                    original_points = len(df)
-                    aligned_points = len(aligned_df)
-                    try:
-                        fund_id = aligned_df.columns[0]
-                        safe_print("{}: {} -> {} 个数据点 (对齐到 {})".format(fund_id, original_points, aligned_points, date_str))
-                    except Exception:
-                        pass
-        
-        # 在所有数据对齐后，统一进行归一化
-        normalized_fund_dfs = []
-        for fund in aligned_fund_dfs:
-            df = fund['df']
-            fund_id = df.columns[0]
-            
-            # 以对齐后的第一个值为基准进行归一化
-            first_value = df[fund_id].iloc[0]
-            if first_value != 0:
-                normalized_df = df.copy()
-                normalized_df.loc[:, fund_id] = normalized_df[fund_id] / first_value
-                normalized_fund_dfs.append({
-                    'df': normalized_df,
-                    'share': fund['share']
-                })
-            else:
-                # 如果第一个值为0，跳过这个基金
-                try:
-                    safe_print("跳过基金 {} (起始值为0)".format(fund_id))
-                except Exception:
-                    pass
-        
-        time_stats = {
-            'aligned': True,
-            'latest_start': latest_start,
-            'earliest_end': earliest_end,
-            'original_count': len(fund_dfs),
-            'aligned_count': len(normalized_fund_dfs)
-        }
-        
-        return normalized_fund_dfs, time_stats
+        log.debug("组合 '%s' 检测到时间不统一，正在对齐到组合内最晚发售基金的开始时间: %.10s", portfolio_name, latest_start)
     else:
-        try:
-            safe_print("组合 '{}' 时间区间已统一，无需对齐".format(portfolio_name))
-        except Exception:
-            pass
-        
-        # 即使不需要时间对齐，也需要进行归一化
-        normalized_fund_dfs = []
-        for fund in fund_dfs:
-            df = fund['df']
-            fund_id = df.columns[0]
-            
-            # 以第一个值为基准进行归一化
-            first_value = df[fund_id].iloc[0]
-            if first_value != 0:
-                normalized_df = df.copy()
-                normalized_df.loc[:, fund_id] = normalized_df[fund_id] / first_value
-                normalized_fund_dfs.append({
-                    'df': normalized_df,
-                    'share': fund['share']
-                })
-            else:
-                # 如果第一个值为0，跳过这个基金
-                try:
-                    safe_print("跳过基金 {} (起始值为0)".format(fund_id))
-                except Exception:
-                    pass
-        
-        time_stats = {
-            'aligned': False,
-            'latest_start': latest_start,
-            'earliest_end': earliest_end,
-            'original_count': len(fund_dfs),
-            'aligned_count': len(normalized_fund_dfs)
-        }
-        return normalized_fund_dfs, time_stats
+        log.debug("组合 '%s' 时间区间已统一，无需对齐", portfolio_name)
+    
+    # 截取（需要对齐时从组合内最晚发售基金开始）与归一化在同一次遍历中完成
+    normalized_fund_dfs = _normalize_and_collect(fund_dfs, latest_start if needs_alignment else None)
+    
+    time_stats = {
+        'aligned': needs_alignment,
+        'latest_start': latest_start,
+        'earliest_end': earliest_end,
+        'original_count': len(fund_dfs),
+        'aligned_count': len(normalized_fund_dfs)
+    }
+    return normalized_fund_dfs, time_stats
+
+
+# 投资指标的计算结果缓存：净值序列（时间与数值）不变时直接复用
+_METRICS_CACHE_SIZE = 128
+_metrics_cache = OrderedDict()
+_metrics_cache_lock = threading.Lock()
+
+
+def _nav_fingerprint(nav_series):
+    """
+    净值序列的指纹，由时间索引和数值的字节内容计算
+    :param nav_series: 净值序列 (pandas Series)
+    :return: 16 位十六进制字符串
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(np.ascontiguousarray(nav_series.index.to_numpy()).view(np.uint8))
+    digest.update(np.ascontiguousarray(nav_series.to_numpy(dtype=np.float64)).view(np.uint8))
+    return digest.hexdigest()
 
 
 def calculate_investment_metrics(nav_series, portfolio_name):
     """
-    计算投资组合的关键指标
+    计算投资组合的关键指标，相同名称和净值序列的结果会被缓存
     :param nav_series: 净值序列 (pandas Series)
     :param portfolio_name: 组合名称
     :return: 投资指标字典
     """
-    try:
-        safe_print("开始计算投资指标: {}".format(portfolio_name))
-    except Exception:
-        pass
+    key = (portfolio_name, len(nav_series), _nav_fingerprint(nav_series))
+    with _metrics_cache_lock:
+        if key in _metrics_cache:
+            _metrics_cache.move_to_end(key)
+            metrics = _metrics_cache[key]
+            return dict(metrics) if metrics else metrics
     
-    if nav_series.empty or len(nav_series) < 2:
-        try:
-            safe_print("{}: 数据不足，需要至少2个数据点".format(portfolio_name))
-        except Exception:
-            pass
-        return None
+    metrics = _compute_investment_metrics(nav_series, portfolio_name)
+    with _metrics_cache_lock:
+        _metrics_cache[key] = metrics
+        if len(_metrics_cache) > _METRICS_CACHE_SIZE:
+            _metrics_cache.popitem(last=False)
+    return dict(metrics) if metrics else metrics
+
+
+def _compute_investment_metrics(nav_series, portfolio_name):
+    """
+    计算投资组合的关键指标（不使用缓存）
+    :param nav_series: 净值序列 (pandas Series)
+    :param portfolio_name: 组合名称
+    :return: 投资指标字典，数据不足时返回 None
+    """
+    log.debug("开始计算投资指标: %s", portfolio_name)
     
-    # 检查是否有NaN值
-    if nav_series.isnull().any():
-        try:
-            safe_print("{}: 发现NaN值，进行清理".format(portfolio_name))
-        except Exception:
-            pass
-        nav_series = nav_series.dropna()
-        if len(nav_series) < 2:
-            try:
-                safe_print("{}: 清理NaN后数据不足".format(portfolio_name))
-            except Exception:
-                pass
-            return None
+    # 去掉空值（没有空值时 dropna 不复制数据），至少需要 2 个数据点
+    nav_series = nav_series.dropna()
+    if len(nav_series) < 2:
+        log.debug("%s: 数据不足，需要至少2个有效数据点", portfolio_name)
+        return None
     
-    # 计算日收益率
-    returns = nav_series.pct_change().dropna()
+    # 计算日收益率，之后的指标都直接在 numpy 数组上计算
+    nav_values = nav_series.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = nav_values[1:] / nav_values[:-1] - 1
+        returns = returns[~np.isnan(returns)]
     
-    if returns.empty:
-        try:
-            safe_print("{}: 无法计算收益率".format(portfolio_name))
-        except Exception:
-            pass
+    if returns.size == 0:
+        log.debug("%s: 无法计算收益率", portfolio_name)
         return None
     
-    try:
-        safe_print("{}: 数据点={}, 收益率点={}".format(portfolio_name, len(nav_series), len(returns)))
-    except Exception:
-        pass
+    log.debug("%s: 数据点=%d, 收益率点=%d", portfolio_name, len(nav_series), returns.size)
+    
+    # 首尾日期与净值只取一次，之后都使用局部变量
+    nav_index = nav_series.index
+    start_date = nav_index[0]
+    end_date = nav_index[-1]
+    first_nav = nav_values[0]
+    last_nav = nav_values[-1]
     
     # 时间范围
-    start_date = nav_series.index[0]
-    end_date = nav_series.index[-1]
     days = (end_date - start_date).days
     years = days / 365.25
     
     # 基础指标
-    total_return = (nav_series.iloc[-1] / nav_series.iloc[0] - 1) * 100
+    total_return = (last_nav / first_nav - 1) * 100
     
     # 年化收益率
     if years > 0:
-        annualized_return = ((nav_series.iloc[-1] / nav_series.iloc[0]) ** (1/years) - 1) * 100
+        annualized_return = ((last_nav / first_nav) ** (1/years) - 1) * 100
     else:
         annualized_return = 0
     
-    # 波动率 (年化)
-    volatility = returns.std() * (252 ** 0.5) * 100  # 假设252个交易日/年
+    # 波动率 (年化)；只有一个收益率点时样本标准差无定义，与 Series.std() 一样取 NaN，
+    # 不调用 np.std 以免其通过 warnings 输出自由度警告
+    if returns.size > 1:
+        volatility = returns.std(ddof=1) * (252 ** 0.5) * 100  # 假设252个交易日/年
+    else:
+        volatility = np.nan
     
     # 最大回撤
-    cumulative = nav_series / nav_series.cummax()
-    max_drawdown = (cumulative.min() - 1) * 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cumulative = nav_values / np.maximum.accumulate(nav_values)
+    max_drawdown = (np.nanmin(cumulative) - 1) * 100
     
     # 夏普比率 (假设无风险利率为3%)
     risk_free_rate = 0.03
     if volatility > 0:
         sharpe_ratio = (annualized_return / 100 - risk_free_rate) / (volatility / 100)
-        try:
-            safe_print(sharpe_ratio)
-        except Exception:
-            pass
     else:
         sharpe_ratio = 0
     
@@ -238,23 +266,19 @@ def calculate_investment_metrics(nav_series, portfolio_name):
         calmar_ratio = 0
     
     # 胜率 (正收益交易日占比)
-    win_rate = (returns > 0).sum() / len(returns) * 100
+    win_rate = np.count_nonzero(returns > 0) / returns.size * 100
     
-    # 最大连续下跌天数
-    nav_changes = nav_series.diff()
-    consecutive_down = 0
-    max_consecutive_down = 0
-    for change in nav_changes:
-        if pd.isna(change):
-            continue
-        if change < 0:
-            consecutive_down += 1
-            max_consecutive_down = max(max_consecutive_down, consecutive_down)
-        else:
-            consecutive_down = 0
+    # 最大连续下跌天数：用下跌标记的边沿位置求出每段连续下跌的长度
+    down = np.diff(nav_values) < 0
+    if down.any():
+        edges = np.flatnonzero(np.diff(np.r_[0, down.view(np.int8), 0]))
+        max_consecutive_down = int((edges[1::2] - edges[0::2]).max())
+    else:
+        max_consecutive_down = 0
     
     # VAR (95%置信度的在险价值)
-    var_95 = returns.quantile(0.05) * 100
+    # np.quantile 内部用 partition 做 O(N) 选择；returns 之后不再使用，允许原地分区以省去一次拷贝
+    var_95 = np.quantile(returns, 0.05, overwrite_input=True) * 100
     
     metrics = {
         'portfolio_name': portfolio_name,
@@ -270,113 +294,81 @@ def calculate_investment_metrics(nav_series, portfolio_name):
         'win_rate': round(win_rate, 2),
         'max_consecutive_down': max_consecutive_down,
         'var_95': round(var_95, 2),
-        'final_nav': round(nav_series.iloc[-1], 4)
+        'final_nav': round(last_nav, 4)
     }
     
-    try:
-        safe_print("{}: 计算完成，总收益={:.2f}%, 年化收益={:.2f}%".format(portfolio_name, total_return, annualized_return))
-    except Exception:
-        pass
+    log.debug("%s: 计算完成，总收益=%.2f%%, 年化收益=%.2f%%, 夏普比率=%.3f",
+              portfolio_name, total_return, annualized_return, sharpe_ratio)
     return metrics
 
 
+@functools.lru_cache(maxsize=1)
+def _format_metric(value, spec, suffix=''):
+    """格式化单个指标值，无法计算的指标（NaN）显示为 N/A"""
+    if value != value:
+        return 'N/A'
+    return f"{value:{spec}}{suffix}"
+
+
+def _analytics_legend():
+    """指标说明区域，内容固定，只构造一次"""
+    return html.Div([
+        html.H4("📊 指标说明", style={'color': COLORS['dark'], 'marginTop': '20px', 'marginBottom': '10px'}),
+        html.Ul([
+            html.Li("夏普比率：>1优秀，0.5-1良好，<0.5需改进", style=_LEGEND_ITEM_STYLE),
+            html.Li("最大回撤：<-10%警戒，<-20%高风险", style=_LEGEND_ITEM_STYLE),
+            html.Li("Calmar比率：年化收益率与最大回撤比值，越高越好", style=_LEGEND_ITEM_STYLE),
+            html.Li("VaR(95%)：95%置信度下的最大可能单日损失", style=_LEGEND_ITEM_STYLE)
+        ], style={'fontSize': '12px', 'color': COLORS['secondary'], 'paddingLeft': '20px'})
+    ])
+
+
 def create_analytics_table(metrics_list):
     """
     创建投资分析数据表
     :param metrics_list: 投资指标列表
     :return: HTML表格组件
     """
-    try:
-        safe_print("create_analytics_table 接收到指标数据:", len(metrics_list) if metrics_list else 0)
-    except Exception:
-        pass
+    log.debug("create_analytics_table 接收到指标数据: %d", len(metrics_list) if metrics_list else 0)
     
     if not metrics_list:
-        try:
-            safe_print("metrics_list 为空，返回暂无数据提示")
-        except Exception:
-            pass
+        log.debug("metrics_list 为空，返回暂无数据提示")
         return html.Div("暂无数据", style={'textAlign': 'center', 'color': COLORS['secondary']})
     
-    # 详细打印每个指标数据
-    for i, metrics in enumerate(metrics_list):
-        try:
-            portfolio_name = metrics.get('portfolio_name', 'N/A')
-            total_return = metrics.get('total_return', 'N/A')
-            safe_print("指标数据 {}: 组合名={}, 总收益={}%".format(i+1, portfolio_name, total_return))
-        except Exception:
-            pass
+    # 详细打印每个指标数据，只在启用 DEBUG 时遍历
+    if log.isEnabledFor(logging.DEBUG):
+        for i, metrics in enumerate(metrics_list, 1):
+            log.debug("指标数据 %d: 组合名=%s, 总收益=%s%%", i,
+                      metrics.get('portfolio_name', 'N/A'), metrics.get('total_return', 'N/A'))
     
-    # 表头
-    header = html.Thead([
-        html.Tr([
-            html.Th("组合名称", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("期间", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("总收益率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("年化收益率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("年化波动率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("最大回撤", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("夏普比率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("Calmar比率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("胜率", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'}),
-            html.Th("VaR(95%)", style={'padding': '12px', 'backgroundColor': COLORS['primary'], 'color': 'white', 'border': 'none', 'textAlign': 'center'})
-        ])
-    ])
+    header = html.Thead(html.Tr([html.Th(name, style=_HEADER_STYLE) for name in _TABLE_HEADERS]))
     
-    # 表格行
     rows = []
     for i, metrics in enumerate(metrics_list):
         # 根据指标好坏设置颜色
-        return_color = COLORS['success'] if metrics['total_return'] > 0 else COLORS['danger']
-        sharpe_color = COLORS['success'] if metrics['sharpe_ratio'] > 1 else (COLORS['warning'] if metrics['sharpe_ratio'] > 0.5 else COLORS['danger'])
-        drawdown_color = COLORS['success'] if metrics['max_drawdown'] > -10 else (COLORS['warning'] if metrics['max_drawdown'] > -20 else COLORS['danger'])
-
-        row_style = {'backgroundColor': COLORS['light'] if i % 2 == 0 else COLORS['white'], 'textAlign': 'center'}
-
-        row = html.Tr([
-            html.Td(metrics['portfolio_name'], style={'padding': '10px', 'fontWeight': '600', **row_style}),
-            html.Td(f"{metrics['start_date']} 至 {metrics['end_date']} ({metrics['days']}天)", 
-                style={'padding': '10px', 'fontSize': '12px', **row_style}),
-            html.Td(f"{metrics['total_return']:+.2f}%", 
-                style={'padding': '10px', 'color': return_color, 'fontWeight': '600', **row_style}),
-            html.Td(f"{metrics['annualized_return']:+.2f}%", 
-                style={'padding': '10px', 'color': return_color, 'fontWeight': '600', **row_style}),
-            html.Td(f"{metrics['volatility']:.2f}%", 
-                style={'padding': '10px', **row_style}),
-            html.Td(f"{metrics['max_drawdown']:.2f}%", 
-                style={'padding': '10px', 'color': drawdown_color, 'fontWeight': '600', **row_style}),
-            html.Td(f"{metrics['sharpe_ratio']:.3f}", 
-                style={'padding': '10px', 'color': sharpe_color, 'fontWeight': '600', **row_style}),
-            html.Td(f"{metrics['calmar_ratio']:.3f}", 
-                style={'padding': '10px', **row_style}),
-            html.Td(f"{metrics['win_rate']:.1f}%", 
-                style={'padding': '10px', **row_style}),
-            html.Td(f"{metrics['var_95']:.2f}%", 
-                style={'padding': '10px', **row_style})
-        ])
-        rows.append(row)
+        return_style = _COLORED_CELL_STYLES['success' if metrics['total_return'] > 0 else 'danger']
+        sharpe = metrics['sharpe_ratio']
+        sharpe_style = _COLORED_CELL_STYLES['success' if sharpe > 1 else ('warning' if sharpe > 0.5 else 'danger')]
+        drawdown = metrics['max_drawdown']
+        drawdown_style = _COLORED_CELL_STYLES['success' if drawdown > -10 else ('warning' if drawdown > -20 else 'danger')]
+        
+        rows.append(html.Tr([
+            html.Td(metrics['portfolio_name'], style=_NAME_CELL_STYLE),
+            html.Td(f"{metrics['start_date']} 至 {metrics['end_date']} ({metrics['days']}天)", style=_PERIOD_CELL_STYLE),
+            html.Td(_format_metric(metrics['total_return'], '+.2f', '%'), style=return_style),
+            html.Td(_format_metric(metrics['annualized_return'], '+.2f', '%'), style=return_style),
+            html.Td(_format_metric(metrics['volatility'], '.2f', '%'), style=_CELL_STYLE),
+            html.Td(_format_metric(drawdown, '.2f', '%'), style=drawdown_style),
+            html.Td(_format_metric(sharpe, '.3f'), style=sharpe_style),
+            html.Td(_format_metric(metrics['calmar_ratio'], '.3f'), style=_CELL_STYLE),
+            html.Td(_format_metric(metrics['win_rate'], '.1f', '%'), style=_CELL_STYLE),
+            html.Td(_format_metric(metrics['var_95'], '.2f', '%'), style=_CELL_STYLE),
+        ], style=_ROW_STYLES[i % 2]))
     
-    table = html.Table([header, html.Tbody(rows)], style={
-        'width': '100%',
-        'borderCollapse': 'collapse',
-        'boxShadow': f'0 2px 8px {COLORS["shadow"]}',
-        'borderRadius': '8px',
-        'overflow': 'hidden'
-    })
+    table = html.Table([header, html.Tbody(rows)], style=_TABLE_STYLE)
     
     # 添加指标说明
-    legend = html.Div([
-        html.H4("📊 指标说明", style={'color': COLORS['dark'], 'marginTop': '20px', 'marginBottom': '10px'}),
-        html.Ul([
-            html.Li("夏普比率：>1优秀，0.5-1良好，<0.5需改进", style={'margin': '5px 0'}),
-            html.Li("最大回撤：<-10%警戒，<-20%高风险", style={'margin': '5px 0'}),
-            html.Li("Calmar比率：年化收益率与最大回撤比值，越高越好", style={'margin': '5px 0'}),
-            html.Li("VaR(95%)：95%置信度下的最大可能单日损失", style={'margin': '5px 0'})
-        ], style={'fontSize': '12px', 'color': COLORS['secondary'], 'paddingLeft': '20px'})
-    ])
+    legend = _analytics_legend()
     
-    try:
-        safe_print("create_analytics_table 返回完整表格组件，包含组合数据:", len(metrics_list))
-    except Exception:
-        pass
+    log.debug("create_analytics_table 返回完整表格组件，包含组合数据: %d", len(metrics_list))
     return html.Div([table, legend])
@@ -1,6 +1,8 @@
 """
 配置文件 - 存储所有颜色配置、样式定义等常量
 """
+import os
+import warnings
 
 # --- 颜色配置 ---
 COLORS = {
@@ -70,243 +72,16 @@ CARD_STYLE = {
     'transition': 'transform 0.2s ease, box-shadow 0.2s ease'
 }
 
-# --- CSS样式字符串 ---
-CSS_STYLES = '''
-/* Custom dropdown styles - 优化垂直居中和clear按钮定位 */
-.Select-control {
-    display: flex !important;
-    align-items: center !important;
-    border: 2px solid #E5E8E8 !important;
-    border-radius: 6px !important;
-    box-shadow: none !important;
-    transition: border-color 0.3s ease !important;
-    font-size: 14px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    height: 38px !important;
-    min-height: 38px !important;
-    box-sizing: border-box !important;
-    position: relative !important;
-}
-.Select-control:hover {
-    border-color: #2E86C1 !important;
-}
-.Select-control.is-focused {
-    border-color: #2E86C1 !important;
-    box-shadow: 0 0 0 3px rgba(46, 134, 193, 0.1) !important;
-}
-
-/* 修复value区域的布局 */
-.Select-value {
-    height: 100% !important;
-    display: flex !important;
-    align-items: center !important;
-    font-size: 16px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 8px 12px !important;
-    margin: 0 !important;
-    line-height: 18px !important;
-    flex: 1 !important;
-    padding-right: 60px !important; /* 为clear按钮和箭头留出空间 */
-}
-
-.Select-placeholder,
-.Select-input {
-    height: 100% !important;
-    display: flex !important;
-    align-items: center !important;
-    font-size: 15px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 8px 12px !important;
-    margin: 0 !important;
-    line-height: 18px !important;
-    flex: 1 !important;
-    padding-right: 60px !important; /* 为clear按钮和箭头留出空间 */
-}
+# --- CSS样式 ---
+# 样式表位于 assets/overlay.css，由 Dash 作为静态文件提供，浏览器可缓存
+CSS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'overlay.css')
 
-.Select-value-label {
-    font-size: 15px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    color: #2C3E50 !important;
-    flex: 1 !important;
-    overflow: hidden !important;
-    text-overflow: ellipsis !important;
-    white-space: nowrap !important;
-}
-.Select-input > input {
-    font-size: 15px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 0 !important;
-    margin: 0 !important;
-    border: none !important;
-    outline: none !important;
-    background: transparent !important;
-    width: 100% !important;
-    line-height: 18px !important;
-}
-.Select-option {
-    display: flex !important;
-    align-items: center !important;
-    height: 38px !important;
-    font-size: 15px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 8px 12px !important;
-    line-height: 18px !important;
-}
-.Select-clear-zone {
-    width: 24px !important;
-    height: 24px !important;
-    position: absolute !important;
-    right: 32px !important; /* 在箭头左侧 */
-    top: 50% !important;
-    transform: translateY(-50%) !important;
-    display: flex !important;
-    align-items: center !important;
-    justify-content: center !important;
-    cursor: pointer !important;
-    z-index: 1 !important;
-}
-
-.Select-clear {
-    font-size: 16px !important;
-    color: #7B7D7D !important;
-    line-height: 1 !important;
-    display: block !important;
-}
-
-.Select-clear:hover {
-    color: #EC7063 !important;
-}
-
-.Select-input > input {
-    font-size: 14px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 0 !important;
-    margin: 0 !important;
-    border: none !important;
-    outline: none !important;
-    background: transparent !important;
-    width: 100% !important;
-    line-height: 18px !important;
-}
-.Select-option {
-    display: flex !important;
-    align-items: center !important;
-    height: 38px !important;
-    font-size: 14px !important;
-    font-family: "Segoe UI", Tahoma, Geneva, Verdana, sans-serif !important;
-    padding: 8px 12px !important;
-    line-height: 18px !important;
-}
-
-/* 箭头区域 */
-.Select-arrow-zone {
-    width: 30px !important;
-    position: absolute !important;
-    right: 0 !important;
-    top: 0 !important;
-    height: 100% !important;
-    display: flex !important;
-    align-items: center !important;
-    justify-content: center !important;
-}
-.Select-arrow {
-    border-color: #7B7D7D transparent transparent !important;
-    border-width: 5px 5px 0 !important;
-    border-style: solid !important;
-    display: block !important;
-}
-
-/* 下拉菜单样式 - 修复z-index问题 */
-.Select-menu-outer {
-    position: absolute !important;
-    top: 100% !important;
-    left: 0 !important;
-    right: 0 !important;
-    z-index: 9999 !important;
-    background: white !important;
-    border: 1px solid #E5E8E8 !important;
-    border-radius: 6px !important;
-    box-shadow: 0 4px 12px rgba(0,0,0,0.15) !important;
-    margin-top: 2px !important;
-    max-height: 200px !important;
-    overflow-y: auto !important;
-}
-
-.Select-menu {
-    background: white !important;
-    border-radius: 6px !important;
-    max-height: 200px !important;
-    overflow-y: auto !important;
-}
 
-.Select-option {
-    padding: 10px 12px !important;
-    cursor: pointer !important;
-    border-bottom: 1px solid #F8F9FA !important;
-    transition: background-color 0.2s ease !important;
-}
-
-.Select-option:last-child {
-    border-bottom: none !important;
-}
-
-.Select-option.is-focused {
-    background-color: #F8F9FA !important;
-    color: #2E86C1 !important;
-}
-
-.Select-option.is-selected {
-    background-color: #2E86C1 !important;
-    color: white !important;
-}
-
-.Select-option:hover {
-    background-color: #F8F9FA !important;
-    color: #2E86C1 !important;
-}
-
-/* Input focus effects */
-input:focus {
-    border-color: #2E86C1 !important;
-    box-shadow: 0 0 0 3px rgba(46, 134, 193, 0.1) !important;
-}
-
-/* Button hover effects */
-button:hover {
-    transform: translateY(-2px) !important;
-    box-shadow: 0 4px 8px rgba(0,0,0,0.15) !important;
-}
-
-/* Card hover effects */
-.portfolio-card:hover {
-    transform: translateY(-2px) !important;
-    box-shadow: 0 8px 24px rgba(0,0,0,0.12) !important;
-}
-
-/* Loading indicator */
-._dash-loading {
-    color: #2E86C1 !important;
-}
-
-/* Plotly graph styling */
-.js-plotly-plot .plotly .modebar {
-    background: rgba(248, 249, 250, 0.9) !important;
-    border-radius: 8px !important;
-    margin: 10px !important;
-}
-
-/* Scrollbar styling */
-::-webkit-scrollbar {
-    width: 8px;
-}
-::-webkit-scrollbar-track {
-    background: #F8F9FA;
-}
-::-webkit-scrollbar-thumb {
-    background: #2E86C1;
-    border-radius: 4px;
-}
-::-webkit-scrollbar-thumb:hover {
-    background: #5DADE2;
-}
-'''
+def __getattr__(name):
+    """兼容旧代码：读取 CSS_STYLES 时给出弃用警告并返回样式表内容"""
+    if name == 'CSS_STYLES':
+        warnings.warn("CSS_STYLES 已移至 assets/overlay.css，由 Dash 自动加载",
+                      DeprecationWarning, stacklevel=2)
+        with open(CSS_FILE, encoding='utf-8') as f:
+            return f.read()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,73 +2,245 @@
 数据处理模块 - 处理数据文件获取、脚本执行、数据保存等功能
 """
 
+import ast
+import importlib.util
+import logging
 import os
+import re
 import subprocess
 import sys
-import pandas as pd
-from io import StringIO
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+# 调试日志，默认级别下不输出，与 analytics 模块一致
+log = logging.getLogger(__name__)
+
 
 # 安全的日志函数
 def safe_print(*args):
-    """安全的打印函数，避免Windows编码问题"""
+    """安全的调试日志函数，避免Windows编码问题；未启用 DEBUG 时不做任何格式化"""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
     try:
-        if __debug__:
-            message = ' '.join(str(arg) for arg in args)
-            safe_message = ''.join(c if ord(c) < 128 else '?' for c in message)
-            safe_print(safe_message[:200])
-    except:
+        message = ' '.join(str(arg) for arg in args)
+        # 非 ASCII 字符替换为 '?'，由 C 实现的编解码器完成
+        safe_message = message.encode('ascii', errors='replace').decode('ascii')
+        log.debug('%s', safe_message[:200])
+    except Exception:
         pass
 
 
-def get_available_data_files():
-    """扫描目录中可用的数据文件 (CSV)"""
+# 当前目录扫描结果的缓存，以目录的 mtime 判断是否失效
+_dir_cache = {'key': None, 'files': [], 'scripts': []}
+_dir_cache_lock = threading.Lock()
+
+
+def _scan_current_dir():
+    """
+    一次扫描当前目录，同时得到数据文件和脚本列表
+    目录内容未变化（mtime 相同）时直接返回缓存结果
+    :return: (CSV 文件列表, 脚本名列表)
+    """
     try:
-        return [f for f in os.listdir('.') if f.endswith('.csv')]
+        stat = os.stat('.')
     except FileNotFoundError:
-        return []
+        return [], []
+    key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+    
+    with _dir_cache_lock:
+        if _dir_cache['key'] != key:
+            files = []
+            scripts = []
+            with os.scandir('.') as entries:
+                for entry in entries:
+                    name = entry.name
+                    # 先按文件名筛选，只对候选项调用 is_file（DirEntry 通常无需额外 stat），跳过同名目录
+                    if name.endswith('.csv'):
+                        if entry.is_file():
+                            files.append(name)
+                    elif name.endswith('.py') and name != 'overlay.py':
+                        if entry.is_file():
+                            # 去掉扩展名
+                            scripts.append(name[:-3])
+            _dir_cache.update(key=key, files=files, scripts=scripts)
+        return list(_dir_cache['files']), list(_dir_cache['scripts'])
+
+
+def get_available_data_files():
+    """扫描目录中可用的数据文件 (CSV)"""
+    return _scan_current_dir()[0]
 
 
 def get_available_scripts():
     """获取可用的自定义脚本"""
+    return _scan_current_dir()[1]
+
+
+def parse_portfolio_state(ctx, fund_names, fund_shares, fund_datas, fund_codes, portfolio_names):
+    """
+    将回调 State 中所有基金输入框的值整理为按组合分组的字典，只遍历一次
+    组合和基金按界面上的顺序加入，空值会被忽略
+    :param ctx: dash.callback_context，states_list 前四项对应基金输入，第五项对应组合名称
+    :return: {portfolio_id: {'funds': {fund_id: {输入类型: 值}}, 'name': 组合名称}}
+    """
+    states_list = getattr(ctx, "states_list", None)
+    if not states_list or len(states_list) < 5:
+        return {}
+    
+    portfolio_names_dict = {
+        state['id']['portfolio_id']: value
+        for state, value in zip(states_list[4], portfolio_names)
+        if value is not None and value != ""
+    }
+    
+    portfolios = {}
+    # 每一行是同一个基金条目的四个输入（名称、份额、数据源、参数）及其取值
+    for row in zip(*states_list[:4], fund_names, fund_shares, fund_datas, fund_codes):
+        for state, value in zip(row[:4], row[4:]):
+            if value is None or value == "":
+                continue
+            state_id = state['id']
+            portfolio_id = state_id['portfolio_id']
+            portfolio = portfolios.get(portfolio_id)
+            if portfolio is None:
+                portfolio = portfolios[portfolio_id] = {
+                    'funds': {},
+                    'name': portfolio_names_dict.get(portfolio_id, f"组合 {len(portfolios) + 1}")
+                }
+            portfolio['funds'].setdefault(state_id['fund_id'], {})[state_id['type']] = value
+    return portfolios
+
+
+# 脚本可提供的进程内入口函数：接收基金代码，返回 DataFrame
+SCRIPT_ENTRY_POINTS = ('fetch', 'get_data')
+
+# 已加载的脚本入口缓存：路径 -> (mtime, 入口函数或 None)
+_script_entries = {}
+_script_locks = {}
+_script_locks_guard = threading.Lock()
+
+
+def _load_script_entry(script_path):
+    """
+    在进程内加载脚本并返回其入口函数，脚本修改后自动重新加载
+    只有在顶层定义了入口函数的脚本才会被导入，其余脚本的顶层代码不会在本进程中执行
+    :param script_path: 脚本路径
+    :return: 入口函数，脚本未定义入口函数时返回 None
+    """
+    mtime = os.stat(script_path).st_mtime_ns
+    with _script_locks_guard:
+        lock = _script_locks.setdefault(script_path, threading.Lock())
+    
+    with lock:
+        cached = _script_entries.get(script_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        with open(script_path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=script_path)
+        defined = {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+        entry_name = next((name for name in SCRIPT_ENTRY_POINTS if name in defined), None)
+        
+        entry = None
+        if entry_name:
+            module_name = "overlay_script_" + os.path.splitext(os.path.basename(script_path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            entry = getattr(module, entry_name)
+        
+        _script_entries[script_path] = (mtime, entry)
+        return entry
+
+
+# 脚本结果缓存：(脚本路径, 基金代码, 脚本 mtime) -> (获取时间, DataFrame)
+# 脚本修改或超过有效期后自动失效（当天晚些时候发布的净值也能被取到），超过上限时淘汰最久未使用的条目
+_SCRIPT_RESULT_CACHE_SIZE = 128
+_SCRIPT_RESULT_TTL = 10 * 60  # 秒
+_script_results = OrderedDict()
+_script_results_lock = threading.Lock()
+
+
+def execute_custom_script(script_name, fund_code, force_refresh=False):
+    """
+    执行自定义脚本获取基金数据，有效期内相同的 (脚本, 基金代码) 直接复用结果
+    :param script_name: 脚本名称（不含扩展名）
+    :param fund_code: 基金代码
+    :param force_refresh: 为 True 时忽略缓存，重新执行脚本
+    :return: DataFrame（缓存对象的浅拷贝）或 None
+    """
+    # 构建脚本路径
+    script_path = f"{script_name}.py"
     try:
-        scripts = []
-        for f in os.listdir('.'):
-            if f.endswith('.py') and f != 'overlay.py' and f != '__pycache__':
-                # 去掉扩展名
-                script_name = f[:-3]
-                scripts.append(script_name)
-        return scripts
-    except FileNotFoundError:
-        return []
+        mtime = os.stat(script_path).st_mtime_ns
+    except OSError:
+        safe_print(f"脚本文件 {script_path} 不存在")
+        return None
+    key = (script_path, str(fund_code), mtime)
+    
+    if not force_refresh:
+        with _script_results_lock:
+            cached = _script_results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < _SCRIPT_RESULT_TTL:
+                _script_results.move_to_end(key)
+                return cached[1].copy(deep=False)
+    
+    df = _run_custom_script(script_name, script_path, fund_code)
+    if df is None:
+        # 失败或空结果不缓存，下次仍会重试
+        return None
+    
+    with _script_results_lock:
+        _script_results[key] = (time.monotonic(), df)
+        _script_results.move_to_end(key)
+        while len(_script_results) > _SCRIPT_RESULT_CACHE_SIZE:
+            _script_results.popitem(last=False)
+    return df.copy(deep=False)
 
 
-def execute_custom_script(script_name, fund_code):
+def _run_custom_script(script_name, script_path, fund_code):
     """
-    执行自定义脚本获取基金数据
+    执行自定义脚本获取基金数据（不经过缓存）
     :param script_name: 脚本名称（不含扩展名）
+    :param script_path: 脚本路径
     :param fund_code: 基金代码
     :return: DataFrame 或 None
     """
+    # 延迟导入 pandas：只列出文件/脚本时不需要为它付出导入开销
+    import pandas as pd
+    
     try:
-        # 构建脚本路径
-        script_path = f"{script_name}.py"
-        if not os.path.exists(script_path):
-            safe_print(f"脚本文件 {script_path} 不存在")
-            return None
+        # 脚本提供入口函数时直接在进程内调用，省去启动解释器和 CSV 往返解析
+        entry = _load_script_entry(script_path)
+        if entry is not None:
+            df = entry(str(fund_code))
+            if df is not None and not isinstance(df, pd.DataFrame):
+                safe_print(f"脚本 {script_name} 返回的不是 DataFrame: {type(df).__name__}")
+                return None
+            if df is None or df.empty:
+                safe_print(f"脚本 {script_name} 返回空数据")
+                return None
+            safe_print(f"脚本 {script_name} 执行成功，获得 {len(df)} 条数据")
+            # 与子进程输出的 CSV 一样转换为 time/nav 标准格式，不能识别时原样返回
+            return _to_standard(df)
         
-        # 执行脚本，优先用 utf-8，失败时自动回退 gbk
+        # 执行脚本，直接拿到原始字节输出，不在 Python 层解码整段文本
         cmd = [sys.executable, script_path, str(fund_code)]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30, encoding='utf-8')
-        except UnicodeDecodeError:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30, encoding='gbk')
+        result = subprocess.run(cmd, capture_output=True, timeout=30)
 
         if result.returncode == 0:
             # 解析CSV数据
-            csv_data = result.stdout.strip()
-            if csv_data:
+            csv_data = result.stdout
+            if csv_data and not csv_data.isspace():
+                # 由 pandas 的 C 解析器直接解码字节，优先用 utf-8，失败时回退 gbk
                 try:
-                    df = pd.read_csv(StringIO(csv_data))
+                    try:
+                        df = pd.read_csv(BytesIO(csv_data), encoding='utf-8')
+                    except UnicodeDecodeError:
+                        df = pd.read_csv(BytesIO(csv_data), encoding='gbk')
                     safe_print(f"脚本 {script_name} 执行成功，获得 {len(df)} 条数据")
                     return df
                 except Exception as e:
@@ -78,7 +250,7 @@ def execute_custom_script(script_name, fund_code):
                 safe_print(f"脚本 {script_name} 返回空数据")
                 return None
         else:
-            safe_print(f"脚本执行失败: {result.stderr}")
+            safe_print(f"脚本执行失败: {result.stderr.decode('utf-8', errors='replace')}")
             return None
             
     except subprocess.TimeoutExpired:
@@ -89,45 +261,177 @@ def execute_custom_script(script_name, fund_code):
         return None
 
 
+# 基金数据的时间绝大多数为 ISO 日期，优先按固定格式解析
+_TIME_FORMAT = '%Y-%m-%d'
+
+
+def parse_time_column(values):
+    """
+    将时间列转换为 datetime
+    先按 %Y-%m-%d 解析，省去逐个推断格式；含时分秒或使用其他分隔符时退回自动推断
+    :param values: 时间列 Series
+    :return: datetime64 Series
+    """
+    import pandas as pd
+    
+    try:
+        return pd.to_datetime(values, format=_TIME_FORMAT, cache=True)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, cache=True)
+
+
+def _to_standard(df):
+    """
+    将脚本返回的数据转换为 time/nav 两列的标准格式，只选列、不截取数据
+    只读取一次列索引和数值列，不能识别时原样返回
+    :param df: 原始 DataFrame
+    :return: 标准格式的 DataFrame（可能就是传入的对象本身）
+    """
+    columns = df.columns
+    if 'time' in columns and 'nav' in columns:
+        # 已经是标准格式，保持原样（后续操作都返回新对象，无需复制）
+        return df
+    if 'FSRQ' in columns and 'DWJZ' in columns:
+        # 转换为标准格式，但保留所有数据
+        return df[['FSRQ', 'DWJZ']].rename(columns={'FSRQ': 'time', 'DWJZ': 'nav'})
+    
+    # 尝试猜测列名
+    lowered = [str(col).lower() for col in columns]
+    time_col = next((columns[i] for i, col in enumerate(lowered) if 'time' in col or 'date' in col), None)
+    if time_col is None:
+        return df
+    # 任意数值类型的列都可作为净值列（float32、Int64 等也包括在内）
+    value_col = next((col for col in df.select_dtypes(include='number').columns if col != time_col), None)
+    if value_col is None:
+        return df
+    return df[[time_col, value_col]].set_axis(['time', 'nav'], axis=1)
+
+
+# 文件名中不允许出现的字符（保留字母、数字、空格、- 和 _）
+_SAFE_NAME_RE = re.compile(r'[^\w \-]')
+
+
+# 保存数据时并发执行的最大任务数（获取数据和写文件都以 I/O 为主）
+_SAVE_MAX_WORKERS = 8
+
+
+def _fetch_script_data(script_name, fund_code):
+    """
+    执行脚本获取单个基金的原始数据，在线程池中执行
+    :param script_name: 脚本名称（不含扩展名）
+    :param fund_code: 基金代码
+    :return: DataFrame 或 None
+    """
+    safe_print(f"正在获取原始数据：{script_name} ({fund_code})")
+    # 保存的是“当前最新”的原始数据，不使用缓存的结果；新结果会写回缓存供图表使用
+    return execute_custom_script(script_name, fund_code, force_refresh=True)
+
+
+def _save_script_data(job, fetch_future):
+    """
+    等待脚本数据获取完成后保存为 CSV，在线程池中执行
+    :param job: save_fund_data_individually 中收集的任务字典
+    :param fetch_future: 获取该基金原始数据的 Future，同一 (脚本, 基金代码) 的任务共用
+    :return: 保存信息字典，脚本没有返回数据时返回 None
+    """
+    original_df = fetch_future.result()
+    if original_df is None or original_df.empty:
+        return None
+    
+    # 确保数据格式标准化，但不进行时间对齐或截取
+    final_df = _to_standard(original_df)
+    
+    # 确保时间列格式，但不截取数据
+    if 'time' in final_df.columns:
+        # 用 assign 生成新对象，避免修改调用方传入的 DataFrame
+        final_df = final_df.assign(time=parse_time_column(final_df['time']))
+        # 按时间排序，但保留所有数据点；DataFetcher 等脚本的输出通常已有序，此时不再排序复制
+        if not final_df['time'].is_monotonic_increasing:
+            final_df = final_df.sort_values('time').reset_index(drop=True)
+    
+    # 保存完整的原始数据
+    # 保留 BOM 以便 Excel 正确识别中文；统一使用 \n 换行，并用 1 MiB 缓冲减少系统调用
+    filename = job['filename']
+    with open(filename, 'w', encoding='utf-8-sig', newline='', buffering=1 << 20) as f:
+        final_df.to_csv(f, index=False, lineterminator='\n')
+    
+    safe_print(f"已保存原始数据：{filename}，包含 {len(final_df)} 行完整数据")
+    
+    return {
+        'filename': filename,
+        'fund_name': job['fund_name'],
+        'fund_code': job['fund_code'] or 'N/A',
+        'source': job['source_info'],
+        'share': job['fund_share'],
+        'from_portfolio': job['portfolio_name'],
+        'rows': len(final_df)
+    }
+
+
 def save_fund_data_individually(portfolios):
     """
     按条目分开保存基金数据到本地CSV文件，保存原始数据（未经时间对齐处理）
     只保存来自脚本（DataFetcher）的数据，跳过本地文件数据源
+    各基金的数据获取和写文件在线程池中并发进行，结果仍按条目顺序返回
     :param portfolios: 组合数据字典
     :return: 保存状态信息
     """
+    import pandas as pd
+    
     saved_files = []
     errors = []
     skipped_files = []  # 记录跳过的本地文件
+    jobs = []
+    used_filenames = set()
+    # 同一批次保存的文件共用一个时间戳，便于对应
+    batch_timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
     
-    # 按条目遍历所有基金数据
+    # 第一遍：按条目遍历所有基金数据，收集需要保存的任务
     for p_id, p_data in portfolios.items():
-        portfolio_name = p_data.get('name', f'组合_{p_id[:8]}')
+        portfolio_name = p_data.get('name', f'组合_{p_id}')
         
         for fund_id, fund_data in p_data['funds'].items():
-            fund_name = fund_data.get('fund-name', f'基金_{fund_id[:8]}')
+            fund_name = fund_data.get('fund-name', f'基金_{fund_id}')
             data_source = fund_data.get('fund-data')
             fund_code = fund_data.get('fund-code')
             fund_share = fund_data.get('fund-share', 0)
             
             if not data_source:
                 continue
-                
-            original_df = None  # 确保我们使用原始数据
-            source_info = ""
             
             try:
                 # 处理脚本数据源 - 重新获取原始数据
                 if data_source.startswith('script:'):
+                    if not fund_code:
+                        continue
                     script_name = data_source[7:]
+                    source_info = f"{script_name}_{fund_code}"
+                    
+                    # 生成文件名
+                    # 命名：基金数据_[基金名称]_[数据源]_[时间戳]
+                    safe_fund_name = _SAFE_NAME_RE.sub('', fund_name).strip()
                     if fund_code:
-                        safe_print(f"正在获取原始数据：{fund_name} ({fund_code})")
-                        # 直接从脚本获取新的原始数据，不使用任何缓存
-                        original_df = execute_custom_script(script_name, fund_code)
-                        source_info = f"{script_name}_{fund_code}"
+                        stem = f"基金数据_{safe_fund_name}_{fund_code}_{batch_timestamp}"
                     else:
-                        continue
-                        
+                        stem = f"基金数据_{safe_fund_name}_{source_info}_{batch_timestamp}"
+                    # 同一批次中重名的条目加序号，避免并发写同一个文件
+                    filename = f"{stem}.csv"
+                    suffix = 2
+                    while filename in used_filenames:
+                        filename = f"{stem}_{suffix}.csv"
+                        suffix += 1
+                    used_filenames.add(filename)
+                    
+                    jobs.append({
+                        'filename': filename,
+                        'fund_name': fund_name,
+                        'fund_code': fund_code,
+                        'fund_share': fund_share,
+                        'script_name': script_name,
+                        'source_info': source_info,
+                        'portfolio_name': portfolio_name
+                    })
+                
                 # 跳过CSV文件数据源 - 本地数据不需要再次保存
                 elif os.path.exists(data_source):
                     safe_print(f"跳过本地数据源：{fund_name} (来源: {data_source})")
@@ -137,59 +441,32 @@ def save_fund_data_individually(portfolios):
                         'source_file': os.path.basename(data_source),
                         'reason': '数据来源已是本地文件'
                     })
-                    continue  # 跳过本地文件数据源
-                
-                if original_df is not None and not original_df.empty:
-                    # 生成文件名
-                    timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
-                    safe_fund_name = "".join(c for c in fund_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                    
-                    # 命名：基金数据_[基金名称]_[数据源]_[时间戳]
-                    if fund_code:
-                        filename = f"基金数据_{safe_fund_name}_{fund_code}_{timestamp}.csv"
-                    else:
-                        filename = f"基金数据_{safe_fund_name}_{source_info}_{timestamp}.csv"
-                    
-                    # 确保数据格式标准化，但不进行时间对齐或截取
-                    if 'time' in original_df.columns and 'nav' in original_df.columns:
-                        # 已经是标准格式，保持原样
-                        final_df = original_df.copy()
-                    elif 'FSRQ' in original_df.columns and 'DWJZ' in original_df.columns:
-                        # 转换为标准格式，但保留所有数据
-                        final_df = original_df.rename(columns={'FSRQ': 'time', 'DWJZ': 'nav'})
-                        final_df = final_df[['time', 'nav']]
-                    else:
-                        # 尝试猜测列名
-                        time_col = next((col for col in original_df.columns if 'time' in col.lower() or 'date' in col.lower()), None)
-                        value_col = next((col for col in original_df.columns if col != time_col and original_df[col].dtype in ['float64', 'int64']), None)
-                        if time_col and value_col:
-                            final_df = original_df[[time_col, value_col]].copy()
-                            final_df.columns = ['time', 'nav']
-                        else:
-                            final_df = original_df.copy()
-                    
-                    # 确保时间列格式，但不截取数据
-                    if 'time' in final_df.columns:
-                        final_df['time'] = pd.to_datetime(final_df['time'])
-                        # 按时间排序，但保留所有数据点
-                        final_df = final_df.sort_values('time').reset_index(drop=True)
-                    
-                    # 保存完整的原始数据
-                    final_df.to_csv(filename, index=False, encoding='utf-8-sig')
-                    
-                    safe_print(f"已保存原始数据：{filename}，包含 {len(final_df)} 行完整数据")
-                    
-                    saved_files.append({
-                        'filename': filename,
-                        'fund_name': fund_name,
-                        'fund_code': fund_code or 'N/A',
-                        'source': source_info,
-                        'share': fund_share,
-                        'from_portfolio': portfolio_name,
-                        'rows': len(final_df)
-                    })
                     
             except Exception as e:
                 errors.append(f"{fund_name} ({fund_code or 'N/A'}): {str(e)}")
     
+    if not jobs:
+        return saved_files, errors, skipped_files
+    
+    # 第二遍：并发获取并写入，按提交顺序收集结果
+    with ThreadPoolExecutor(max_workers=min(_SAVE_MAX_WORKERS, len(jobs))) as executor:
+        # 同一批次中重复的 (脚本, 基金代码) 只提交一次获取任务，写文件的任务共用其结果；
+        # 获取任务全部先于写文件任务提交，线程池按提交顺序取任务，等待结果的写任务不会饿死获取任务
+        fetch_futures = {}
+        for job in jobs:
+            key = (job['script_name'], str(job['fund_code']))
+            if key not in fetch_futures:
+                fetch_futures[key] = executor.submit(_fetch_script_data, job['script_name'], job['fund_code'])
+        futures = [
+            executor.submit(_save_script_data, job, fetch_futures[(job['script_name'], str(job['fund_code']))])
+            for job in jobs
+        ]
+        for job, future in zip(jobs, futures):
+            try:
+                saved = future.result()
+                if saved is not None:
+                    saved_files.append(saved)
+            except Exception as e:
+                errors.append(f"{job['fund_name']} ({job['fund_code'] or 'N/A'}): {str(e)}")
+    
     return saved_files, errors, skipped_files
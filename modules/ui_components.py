@@ -2,7 +2,9 @@
 UI组件模块 - 创建基金条目、组合卡片等UI组件
 """
 
-import uuid
+import functools
+import itertools
+import secrets
 from dash import dcc, html
 from modules.config import (
     COLORS, INPUT_STYLE, DROPDOWN_STYLE, DANGER_BUTTON_STYLE, 
@@ -11,16 +13,140 @@ from modules.config import (
 from modules.data_handler import get_available_data_files, get_available_scripts
 
 
-def create_fund_entry(portfolio_id, fund_id):
-    """创建单个基金条目的UI"""
-    # 每次创建时都重新获取最新的文件和脚本列表，确保包含最新保存的文件
-    available_files = get_available_data_files()
-    available_scripts = get_available_scripts()
-    
-    data_source_options = (
-        [{'label': f'📁 {f}', 'value': f} for f in available_files] +
-        [{'label': f'🔧 脚本: {s}', 'value': f'script:{s}'} for s in available_scripts]
+# 组件 ID 生成：进程内递增计数器，加上进程启动时生成的随机前缀，
+# 避免服务重启后新 ID 与浏览器中残留的旧 ID 冲突
+_ID_PREFIX = secrets.token_hex(3)
+_id_counter = itertools.count()
+
+
+def new_id():
+    """
+    生成组合/基金条目使用的短 ID
+    :return: 形如 'a1b2c3-1f' 的字符串
+    """
+    return f"{_ID_PREFIX}-{next(_id_counter):x}"
+
+
+# --- 基金条目与组合卡片的静态样式 ---
+# 这些样式与 portfolio_id / fund_id 无关，在导入时合并一次，所有组件共享同一个字典
+# （Dash 只序列化 style，不会修改它）
+_FUND_NAME_INPUT_STYLE = {**INPUT_STYLE, 'width': '240px', 'marginRight': '8px'}
+_FUND_SHARE_INPUT_STYLE = {**INPUT_STYLE, 'width': '150px', 'marginRight': '8px'}
+_FUND_DATA_DROPDOWN_STYLE = {**DROPDOWN_STYLE, 'width': '100%'}
+_FUND_DATA_WRAPPER_STYLE = {'flex': '1', 'marginRight': '8px'}
+_REMOVE_FUND_BTN_STYLE = {
+    **DANGER_BUTTON_STYLE,
+    'width': '36px',
+    'height': '36px',
+    'borderRadius': '50%',
+    'display': 'flex',
+    'alignItems': 'center',
+    'justifyContent': 'center',
+    'fontSize': '14px',
+    'flexShrink': '0'
+}
+_FUND_MAIN_ROW_STYLE = {'display': 'flex', 'alignItems': 'center', 'marginBottom': '8px'}
+_FUND_CODE_INPUT_STYLE = {
+    **INPUT_STYLE,
+    'width': '200px',
+    'marginRight': '8px',
+    'display': 'none'  # 默认隐藏
+}
+_PARAM_HINT_STYLE = {
+    'fontSize': '12px',
+    'color': COLORS['secondary'],
+    'fontStyle': 'italic',
+    'display': 'none'  # 默认隐藏
+}
+_SCRIPT_STATUS_STYLE = {'marginLeft': '10px', 'fontSize': '12px', 'color': COLORS['secondary']}
+_FUND_CODE_ROW_STYLE = {'display': 'flex', 'alignItems': 'center'}
+_FUND_ENTRY_STYLE = {
+    'marginBottom': '10px',
+    'padding': '12px',
+    'backgroundColor': COLORS['white'],
+    'borderRadius': '8px',
+    'border': f'1px solid {COLORS["border"]}',
+    'boxShadow': f'0 2px 4px {COLORS["shadow"]}',
+    'transition': 'transform 0.2s ease'
+}
+
+_PORTFOLIO_NAME_INPUT_STYLE = {
+    **INPUT_STYLE,
+    'width': '250px',
+    'fontWeight': '600',
+    'fontSize': '16px',
+    'marginRight': '15px',
+    'border': f'2px solid {COLORS["secondary"]}'
+}
+_REMOVE_PORTFOLIO_BTN_STYLE = {
+    **DANGER_BUTTON_STYLE,
+    'display': 'inline-flex',
+    'alignItems': 'center',
+    'gap': '5px'
+}
+_PORTFOLIO_HEADER_STYLE = {
+    'display': 'flex',
+    'alignItems': 'center',
+    'justifyContent': 'space-between',
+    'marginBottom': '20px',
+    'paddingBottom': '15px',
+    'borderBottom': f'2px solid {COLORS["border"]}'
+}
+_FUNDS_TITLE_STYLE = {
+    'color': COLORS['dark'],
+    'marginBottom': '15px',
+    'fontSize': '1.1rem',
+    'fontWeight': '600'
+}
+_ADD_FUND_BTN_STYLE = {**PRIMARY_BUTTON_STYLE, 'marginTop': '15px'}
+_SHARE_FEEDBACK_STYLE = {
+    'color': COLORS['danger'],
+    'marginTop': '15px',
+    'fontWeight': '600',
+    'fontSize': '14px',
+    'textAlign': 'center',
+    'padding': '8px',
+    'borderRadius': '6px',
+    'backgroundColor': f'{COLORS["light"]}'
+}
+_PORTFOLIO_CARD_STYLE = {
+    **CARD_STYLE,
+    'position': 'relative',
+    'overflow': 'visible'
+}
+
+
+def _remove_fund_btn(portfolio_id, fund_id):
+    """创建基金条目的删除按钮，只有 id 随条目变化，样式为共享的常量"""
+    return html.Button('🗑️',
+                       id={'type': 'remove-fund-btn', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
+                       n_clicks=0,
+                       title="删除此基金",
+                       style=_REMOVE_FUND_BTN_STYLE)
+
+
+def get_data_source_options():
+    """
+    获取数据源下拉框的选项（本地 CSV 文件 + 自定义脚本）
+    每次调用都重新获取最新的文件和脚本列表，确保包含最新保存的文件
+    :return: Dropdown options 列表
+    """
+    return (
+        [{'label': f'📁 {f}', 'value': f} for f in get_available_data_files()] +
+        [{'label': f'🔧 脚本: {s}', 'value': f'script:{s}'} for s in get_available_scripts()]
     )
+
+
+def create_fund_entry(portfolio_id, fund_id, data_source_options=None):
+    """
+    创建单个基金条目的UI
+    :param portfolio_id: 组合 ID
+    :param fund_id: 基金条目 ID
+    :param data_source_options: 数据源选项，一次创建多个条目时可传入同一个列表共享；
+                                为 None 时重新获取
+    """
+    if data_source_options is None:
+        data_source_options = get_data_source_options()
     
     return html.Div([
         # 第一行：基金名称、份额、数据源
@@ -28,11 +154,7 @@ def create_fund_entry(portfolio_id, fund_id):
             dcc.Input(
                 id={'type': 'fund-name', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
                 placeholder='💼 条目名',
-                style={
-                    **INPUT_STYLE, 
-                    'width': '240px', 
-                    'marginRight': '8px'
-                }
+                style=_FUND_NAME_INPUT_STYLE
             ),
             dcc.Input(
                 id={'type': 'fund-share', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
@@ -41,88 +163,50 @@ def create_fund_entry(portfolio_id, fund_id):
                 min=0,
                 max=100,
                 step=0.01,
-                style={
-                    **INPUT_STYLE, 
-                    'width': '150px', 
-                    'marginRight': '8px'
-                }
+                style=_FUND_SHARE_INPUT_STYLE
             ),
             html.Div([
                 dcc.Dropdown(
                     id={'type': 'fund-data', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
                     options=data_source_options,
                     placeholder='📂 选择数据源',
-                    style={**DROPDOWN_STYLE, 'width': '100%'},
+                    style=_FUND_DATA_DROPDOWN_STYLE,
                     className='modern-dropdown'
                 )
-            ], style={
-                'flex': '1', 
-                'marginRight': '8px'
-            }),
-            html.Button('🗑️', 
-                       id={'type': 'remove-fund-btn', 'portfolio_id': portfolio_id, 'fund_id': fund_id}, 
-                       n_clicks=0, 
-                       title="删除此基金",
-                       style={
-                           **DANGER_BUTTON_STYLE,
-                           'width': '36px',
-                           'height': '36px',
-                           'borderRadius': '50%',
-                           'display': 'flex',
-                           'alignItems': 'center',
-                           'justifyContent': 'center',
-                           'fontSize': '14px',
-                           'flexShrink': '0'
-                       })
-        ], style={
-            'display': 'flex', 
-            'alignItems': 'center', 
-            'marginBottom': '8px'
-        }),
+            ], style=_FUND_DATA_WRAPPER_STYLE),
+            _remove_fund_btn(portfolio_id, fund_id)
+        ], style=_FUND_MAIN_ROW_STYLE),
         
         # 第二行：可选参数（仅在选择脚本时显示）
         html.Div([
             dcc.Input(
                 id={'type': 'fund-code', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
                 placeholder='🔢 可选参数',
-                style={
-                    **INPUT_STYLE, 
-                    'width': '200px',
-                    'marginRight': '8px',
-                    'display': 'none'  # 默认隐藏
-                }
+                style=_FUND_CODE_INPUT_STYLE
             ),
             html.Span(
                 "填入基金代码或其他所需参数",
-                style={
-                    'fontSize': '12px',
-                    'color': COLORS['secondary'],
-                    'fontStyle': 'italic',
-                    'display': 'none'  # 默认隐藏
-                },
+                style=_PARAM_HINT_STYLE,
                 id={'type': 'param-hint', 'portfolio_id': portfolio_id, 'fund_id': fund_id}
             ),
             html.Div(
                 id={'type': 'script-status', 'portfolio_id': portfolio_id, 'fund_id': fund_id},
-                style={'marginLeft': '10px', 'fontSize': '12px', 'color': COLORS['secondary']}
+                style=_SCRIPT_STATUS_STYLE
             )
-        ], style={'display': 'flex', 'alignItems': 'center'}, 
+        ], style=_FUND_CODE_ROW_STYLE, 
            id={'type': 'fund-code-row', 'portfolio_id': portfolio_id, 'fund_id': fund_id})
         
-    ], id=f"fund-entry-{fund_id}", style={
-        'marginBottom': '10px',
-        'padding': '12px',
-        'backgroundColor': COLORS['white'],
-        'borderRadius': '8px',
-        'border': f'1px solid {COLORS["border"]}',
-        'boxShadow': f'0 2px 4px {COLORS["shadow"]}',
-        'transition': 'transform 0.2s ease'
-    })
+    ], id=f"fund-entry-{fund_id}", style=_FUND_ENTRY_STYLE)
 
 
-def create_portfolio_card(portfolio_id, n_clicks):
-    """创建单个投资组合卡片的UI"""
-    initial_fund_id = str(uuid.uuid4())
+def create_portfolio_card(portfolio_id, n_clicks, data_source_options=None):
+    """
+    创建单个投资组合卡片的UI
+    :param portfolio_id: 组合 ID
+    :param n_clicks: 添加按钮的点击次数，用于生成默认组合名称
+    :param data_source_options: 传给初始基金条目的数据源选项，为 None 时重新获取
+    """
+    initial_fund_id = new_id()
     
     return html.Div([
         html.Div([
@@ -132,42 +216,18 @@ def create_portfolio_card(portfolio_id, n_clicks):
                     id={'type': 'portfolio-name', 'portfolio_id': portfolio_id},
                     value=f'投资组合 {n_clicks}' if portfolio_id != 'base-portfolio' else '基础组合',
                     placeholder='组合名称',
-                    style={
-                        **INPUT_STYLE,
-                        'width': '250px',
-                        'fontWeight': '600',
-                        'fontSize': '16px',
-                        'marginRight': '15px',
-                        'border': f'2px solid {COLORS["secondary"]}'
-                    }
+                    style=_PORTFOLIO_NAME_INPUT_STYLE
                 ),
             ], style={'display': 'flex', 'alignItems': 'center', 'flex': '1'}),
             html.Button('🗑️ 删除组合', 
                        id={'type': 'remove-portfolio-btn', 'portfolio_id': portfolio_id}, 
                        n_clicks=0,
-                       style={
-                           **DANGER_BUTTON_STYLE,
-                           'display': 'inline-flex',
-                           'alignItems': 'center',
-                           'gap': '5px'
-                       })
-        ], style={
-            'display': 'flex', 
-            'alignItems': 'center', 
-            'justifyContent': 'space-between',
-            'marginBottom': '20px',
-            'paddingBottom': '15px',
-            'borderBottom': f'2px solid {COLORS["border"]}'
-        }),
+                       style=_REMOVE_PORTFOLIO_BTN_STYLE)
+        ], style=_PORTFOLIO_HEADER_STYLE),
         
         html.Div([
-            html.H4('💰 基金配置', style={
-                'color': COLORS['dark'],
-                'marginBottom': '15px',
-                'fontSize': '1.1rem',
-                'fontWeight': '600'
-            }),
-            html.Div([create_fund_entry(portfolio_id, initial_fund_id)], 
+            html.H4('💰 基金配置', style=_FUNDS_TITLE_STYLE),
+            html.Div([create_fund_entry(portfolio_id, initial_fund_id, data_source_options)], 
                     id={'type': 'funds-container', 'portfolio_id': portfolio_id})
         ]),
         
@@ -175,28 +235,19 @@ def create_portfolio_card(portfolio_id, n_clicks):
             html.Button('➕ 添加基金', 
                        id={'type': 'add-fund-btn', 'portfolio_id': portfolio_id}, 
                        n_clicks=0, 
-                       style={**PRIMARY_BUTTON_STYLE, 'marginTop': '15px'}),
+                       style=_ADD_FUND_BTN_STYLE),
             html.Div(id={'type': 'share-feedback', 'portfolio_id': portfolio_id}, 
-                    style={
-                        'color': COLORS['danger'], 
-                        'marginTop': '15px', 
-                        'fontWeight': '600',
-                        'fontSize': '14px',
-                        'textAlign': 'center',
-                        'padding': '8px',
-                        'borderRadius': '6px',
-                        'backgroundColor': f'{COLORS["light"]}'
-                    })
+                    style=_SHARE_FEEDBACK_STYLE)
         ], style={'textAlign': 'center'})
         
     ], id={'type': 'portfolio-card', 'portfolio_id': portfolio_id}, 
-       style={
-           **CARD_STYLE,
-           'position': 'relative',
-           'overflow': 'visible'
-       })
+       style=_PORTFOLIO_CARD_STYLE)
 
 
+# 以下三个区域是不带参数的静态组件树，只构建一次并复用。
+# 回调通过组件 ID 更新其中的 graph-container / analytics-section 等内容，
+# 不会修改这里返回的 Python 对象，因此缓存是安全的。
+@functools.lru_cache(maxsize=1)
 def create_header_section():
     """创建页面头部区域"""
     return html.Div([
@@ -224,6 +275,7 @@ def create_header_section():
     })
 
 
+@functools.lru_cache(maxsize=1)
 def create_controls_section():
     """创建控制按钮区域"""
     return html.Div([
@@ -237,6 +289,7 @@ def create_controls_section():
     })
 
 
+@functools.lru_cache(maxsize=1)
 def create_chart_section():
     """创建图表区域"""
     return html.Div([
@@ -5,47 +5,239 @@
 
 import dash
 from dash import dcc, html, Input, Output, State, ALL
-import pandas as pd
-import plotly.graph_objs as go
+import plotly.graph_objs as go  # dash 启动时已加载，无需延迟
+import base64
+import functools
+import hashlib
+import json
+import logging
 import os
-import uuid
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入模块化组件
-from modules.config import COLORS, INPUT_STYLE, CSS_STYLES, PRIMARY_BUTTON_STYLE
+from modules.config import COLORS, INPUT_STYLE, PRIMARY_BUTTON_STYLE
 from modules.data_handler import (
     get_available_data_files, get_available_scripts, 
-    execute_custom_script, save_fund_data_individually
-)
-from modules.analytics import (
-    align_time_series_data, calculate_investment_metrics, 
-    create_analytics_table
+    execute_custom_script, save_fund_data_individually, parse_portfolio_state,
+    parse_time_column
 )
 from modules.ui_components import (
     create_fund_entry, create_portfolio_card, create_header_section,
-    create_controls_section, create_chart_section
+    create_controls_section, create_chart_section, new_id,
+    get_data_source_options
 )
 
-# 简单的日志函数，避免编码问题
-def safe_print(*args):
-    """安全的打印函数，避免Windows编码问题"""
-    try:
-        # 只在开发模式下输出，并且转换为简单的ASCII
-        if __debug__:
-            message = ' '.join(str(arg) for arg in args)
-            # 移除可能有问题的字符
-            safe_message = ''.join(c if ord(c) < 128 else '?' for c in message)
-            safe_print(safe_message[:200])  # 限制长度
-    except:
-        pass  # 完全忽略打印错误
+# 调试日志，默认级别下不输出；参数以 %s 方式传入，只有启用 DEBUG 时才会格式化
+# 直接运行时设置环境变量 OVERLAY_DEBUG=1 可开启全部模块的调试日志
+log = logging.getLogger(__name__)
+
+# 本地 CSV 数据的解析结果缓存，文件 mtime 是键的一部分，文件修改后自动失效
+# 返回的 DataFrame 会被多次回调复用，调用方只能生成新对象（rename 等），不能原地修改
+@functools.lru_cache(maxsize=256)
+def _read_fund_csv(path, mtime_ns):
+    """
+    读取本地 CSV 数据文件，转换为以时间为索引（已排序）的单列净值 DataFrame
+    :param path: CSV 文件路径
+    :param mtime_ns: 文件修改时间，仅作为缓存键使用
+    :return: DataFrame，无法识别格式时返回 None
+    """
+    import numpy as np
+    import pandas as pd
+    
+    # 先只读表头判断格式，再只读取需要的两列，跳过其余列的解析
+    columns = pd.read_csv(path, nrows=0).columns
+    if 'time' in columns:
+        # 第一个不是时间列的列作为净值列，大小写比较在 pandas 的字符串方法中完成
+        not_time = columns.str.lower().to_numpy() != 'time'
+        if not not_time.any():
+            return None
+        value_col = columns[not_time.argmax()]
+        df = pd.read_csv(path, usecols=['time', value_col])
+        df['time'] = parse_time_column(df['time'])
+        df = df.set_index('time').sort_index()
+        return df[[value_col]].astype(np.float64)
+    elif 'FSRQ' in columns and 'DWJZ' in columns:
+        df = pd.read_csv(path, usecols=['FSRQ', 'DWJZ'])
+        df = df.rename(columns={'FSRQ': 'time', 'DWJZ': 'nav'})
+        df['time'] = parse_time_column(df['time'])
+        df = df.set_index('time')
+        df = df.sort_index()
+        df['nav'] = pd.to_numeric(df['nav'], errors='coerce')
+        df = df.dropna()
+        return df[['nav']].astype(np.float64)
+    return None
+
+
+def _load_fund_df(data_source, fund_code):
+    """
+    按数据源加载单个基金的原始净值数据（不归一化）
+    净值统一为 float64：本地 CSV 可能是任意序列（如点位较高的指数），float32 会丢失有效数字
+    脚本结果由 execute_custom_script 在有效期内缓存，本地文件由 _read_fund_csv 按 mtime 缓存
+    :param data_source: 数据源（CSV 文件路径或 'script:脚本名'）
+    :param fund_code: 脚本使用的基金代码
+    :return: 以时间为索引（已排序）、只有一列净值的 DataFrame，无法加载时返回 None
+    """
+    import numpy as np
+    import pandas as pd
+    
+    if data_source.startswith('script:'):
+        script_name = data_source[7:]
+        if not fund_code:
+            log.debug("使用脚本 %s 但未提供基金代码", script_name)
+            return None
+        log.debug("正在执行脚本 %s 获取基金 %s 数据...", script_name, fund_code)
+        df = execute_custom_script(script_name, fund_code)
+        if df is None or 'time' not in df.columns:
+            log.debug("脚本 %s 执行失败或返回数据格式不正确", script_name)
+            return None
+        df['time'] = parse_time_column(df['time'])
+        df = df.set_index('time').sort_index()
+        value_cols = df.select_dtypes(include='number').columns.tolist()
+        if not value_cols:
+            log.debug("脚本返回的数据中没有找到数值列")
+            return None
+        log.debug("脚本数据处理成功: %d 条记录", len(df))
+        return df[[value_cols[0]]].astype(np.float64)
+    elif os.path.exists(data_source):
+        return _read_fund_csv(data_source, os.stat(data_source).st_mtime_ns)
+    return None
+
+
+# 并发加载基金数据的线程数上限（CSV 解析在 C 层释放 GIL，脚本执行以等待 I/O 为主）
+_LOAD_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def _load_all_fund_dfs(portfolios, require_share=False):
+    """
+    并发加载所有组合中基金的原始数据，相同的数据源只加载一次
+    :param portfolios: parse_portfolio_state 返回的组合字典
+    :param require_share: 为 True 时跳过未填写份额的基金
+    :return: {(portfolio_id, fund_id): DataFrame}，加载失败的基金不在结果中
+    """
+    jobs = {}
+    for p_id, p_data in portfolios.items():
+        for fund_id, fund_data in p_data['funds'].items():
+            data_source = fund_data.get('fund-data')
+            if not data_source or (require_share and fund_data.get('fund-share') is None):
+                continue
+            jobs[(p_id, fund_id)] = (data_source, fund_data.get('fund-code'))
+    
+    def load(source):
+        data_source, fund_code = source
+        try:
+            return _load_fund_df(data_source, fund_code)
+        except Exception as e:
+            log.debug("Error processing file %s: %s", data_source, e)
+            return None
+    
+    sources = list(dict.fromkeys(jobs.values()))
+    if len(sources) > 1:
+        with ThreadPoolExecutor(max_workers=min(_LOAD_MAX_WORKERS, len(sources))) as executor:
+            results = dict(zip(sources, executor.map(load, sources)))
+    else:
+        results = {source: load(source) for source in sources}
+    
+    return {key: results[source] for key, source in jobs.items() if results[source] is not None}
+
+
+def _portfolio_nav(fund_dfs, normalize=False):
+    """
+    按份额加权合成组合净值
+    各基金按时间外连接、前后填充后，用一次矩阵-向量乘法代替逐个基金累加
+    :param fund_dfs: [{'df': 以时间为索引的单列净值 DataFrame, 'share': 份额百分比（调用方保证不为 None）}]
+    :param normalize: 为 True 时先将各基金除以其第一个净值（为 0 时不归一化）
+    :return: 组合净值 Series
+    """
+    import numpy as np
+    import pandas as pd
+    
+    if len(fund_dfs) == 1:
+        # 单只基金：无需对齐和填充，没有空值和重复时间时直接按份额缩放
+        fund = fund_dfs[0]
+        index = fund['df'].index
+        values = fund['df'].iloc[:, 0].to_numpy(dtype=np.float64)
+        if len(values) and index.is_unique and not np.isnan(values).any():
+            scale = fund['share'] / 100.0
+            if normalize and values[0] != 0:
+                scale /= values[0]
+            return pd.Series(values * scale, index=index)
+    
+    # 先求所有基金时间的并集，再把各基金的值按位置写入预分配的二维数组，
+    # 代替 pd.concat 的逐列对齐
+    indexes = [f['df'].index for f in fund_dfs]
+    union_idx = functools.reduce(np.union1d, [index.to_numpy() for index in indexes])
+    # 加权求和在 float64 下进行，避免后续收益率、波动率等指标累积误差
+    values = np.full((len(union_idx), len(fund_dfs)), np.nan, dtype=np.float64)
+    for k, (f, index) in enumerate(zip(fund_dfs, indexes)):
+        values[np.searchsorted(union_idx, index.to_numpy()), k] = f['df'].iloc[:, 0].to_numpy()
+    
+    # 前向填充：每个位置取该列最近一个有值的行号
+    mask = np.isnan(values)
+    rows = np.where(mask, 0, np.arange(len(union_idx))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    cols = np.arange(len(fund_dfs))
+    values = values[rows, cols]
+    # 后向填充：前向填充后只剩开头的空值，用各列第一个有效值补齐
+    # 直接写回前向填充的结果数组，不再分配新数组
+    first_valid = values[(~mask).argmax(axis=0), cols]
+    np.copyto(values, first_valid, where=np.isnan(values))
+    
+    weights = np.array([f['share'] for f in fund_dfs], dtype=np.float64) / 100.0
+    # 整列都没有数据的基金不参与计算
+    valid = ~np.isnan(values).all(axis=0)
+    if normalize:
+        # 后向填充后第一行即各基金的第一个净值，归一化可并入权重，无需逐列相除
+        first = values[0]
+        weights = weights / np.where(first != 0, first, 1.0)
+    return pd.Series(values[:, valid] @ weights[valid], index=pd.DatetimeIndex(union_idx, name=indexes[0].name))
+
 
 # --- App Initialization ---
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 app.title = "基金组合回测"
 
+# 保存结果消息的样式：保留换行，沿用页面字体
+_SAVE_MESSAGE_STYLE = {'whiteSpace': 'pre-wrap', 'margin': 0, 'fontFamily': 'inherit', 'lineHeight': '1.5'}
+
+# 基金参数输入框和提示文本的显示/隐藏样式，回调中直接复用
+_CODE_VISIBLE_STYLE = {**INPUT_STYLE, 'width': '200px', 'marginRight': '8px', 'display': 'block'}
+_CODE_HIDDEN_STYLE = {**_CODE_VISIBLE_STYLE, 'display': 'none'}
+_HINT_VISIBLE_STYLE = {'fontSize': '12px', 'color': COLORS['secondary'], 'fontStyle': 'italic', 'display': 'inline'}
+_HINT_HIDDEN_STYLE = {**_HINT_VISIBLE_STYLE, 'display': 'none'}
+
+# 两个图表回调共用的基础布局，只在启动时校验一次并展开为普通字典；
+# 回调中直接用字典构造图表，跳过 plotly 对每条曲线和布局的重复校验
+_BASE_LAYOUT = go.Layout(
+    xaxis={'title': '时间'},
+    yaxis={'title': '收益率 (%)', 'tickformat': '.1f'},
+    hovermode='x unified',
+    template='plotly_white',
+    legend_title_text='组合',
+    margin=dict(l=40, r=40, t=40, b=40)
+).to_plotly_json()
+_NORMALIZED_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': '智能归一化组合对比 - 基于最晚开始时间'},
+    'margin': {**_BASE_LAYOUT['margin'], 't': 60},
+}
+_HOVER_TEMPLATE = '<b>%{fullData.name}</b><br>时间: %{x}<br>收益率: %{y:.2f}%<br><extra></extra>'
+
+
+def _typed_array(values):
+    """
+    将 float64 数组编码为 plotly.js 的类型化数组（base64），与 plotly 校验后的序列化结果一致，
+    避免直接使用字典构造图表时数组被展开成 JSON 数字列表
+    :param values: 一维 numpy 数组
+    :return: {'dtype': 'f8', 'bdata': base64 字符串}
+    """
+    import numpy as np
+    
+    return {'dtype': 'f8', 'bdata': base64.b64encode(np.ascontiguousarray(values, dtype='<f8')).decode('ascii')}
+
 # Create initial base portfolio that cannot be deleted
 initial_portfolio_id = 'base-portfolio'
-initial_fund_id = str(uuid.uuid4())
+initial_fund_id = new_id()
 
 # --- App Layout ---
 app.layout = html.Div([
@@ -139,46 +331,8 @@ def save_data_to_csv(n_clicks, fund_names, fund_shares, fund_datas, fund_codes,
     import dash
     ctx = dash.callback_context
     
-    # Parse all inputs into a structured dictionary (same logic as generate chart)
-    portfolios = {}
-    portfolio_names_dict = {}
-    
-    # Get portfolio names
-    if hasattr(ctx, "states_list") and len(ctx.states_list) > 4:
-        for i, value in enumerate(portfolio_names):
-            if value is not None and value != "":
-                state_id = ctx.states_list[4][i]['id']
-                portfolio_id = state_id['portfolio_id']
-                portfolio_names_dict[portfolio_id] = value
-
-    # Process fund inputs
-    fund_inputs = [
-        (fund_names, 0),
-        (fund_shares, 1),
-        (fund_datas, 2),
-        (fund_codes, 3)
-    ]
-    
-    for arr, state_idx in fund_inputs:
-        if hasattr(ctx, "states_list") and len(ctx.states_list) > state_idx:
-            for i, value in enumerate(arr):
-                if value is None or value == "":
-                    continue
-                state_id = ctx.states_list[state_idx][i]['id']
-                input_type = state_id['type']
-                portfolio_id = state_id['portfolio_id']
-                fund_id = state_id['fund_id']
-                
-                if portfolio_id not in portfolios:
-                    portfolios[portfolio_id] = {
-                        'funds': {},
-                        'name': portfolio_names_dict.get(portfolio_id, f"组合 {len(portfolios) + 1}")
-                    }
-                if fund_id not in portfolios[portfolio_id]['funds']:
-                    portfolios[portfolio_id]['funds'][fund_id] = {}
-                portfolios[portfolio_id]['funds'][fund_id][input_type] = value
-                if portfolio_id in portfolio_names_dict:
-                    portfolios[portfolio_id]['name'] = portfolio_names_dict[portfolio_id]
+    # Parse all inputs into a structured dictionary
+    portfolios = parse_portfolio_state(ctx, fund_names, fund_shares, fund_datas, fund_codes, portfolio_names)
     
     # Save data to CSV files (按条目分开保存，只保存脚本数据源)
     saved_files, errors, skipped_files = save_fund_data_individually(portfolios)
@@ -209,9 +363,8 @@ def save_data_to_csv(n_clicks, fund_names, fund_shares, fund_datas, fund_codes,
             for error in errors:
                 message_parts.append(f"• {error}")
         
-        message = html.Div([
-            html.P(part, style={'margin': '2px 0'}) for part in message_parts
-        ])
+        # 整段消息放在一个 <pre> 中，换行由 white-space 保留，不必为每行创建一个组件
+        message = html.Pre('\n'.join(message_parts), style=_SAVE_MESSAGE_STYLE)
         style = {
             'textAlign': 'center',
             'marginBottom': '20px',
@@ -257,6 +410,9 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
     """智能归一化：以最晚开始的组合时间为基准，重新归一化所有组合净值"""
     
     import dash
+    import numpy as np
+    import pandas as pd
+    from modules.analytics import calculate_investment_metrics, create_analytics_table
     ctx = dash.callback_context
     
     # 强化检查逻辑，确保只有在按钮被明确点击时才执行
@@ -269,109 +425,31 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
     if not ctx.triggered or ctx.triggered[0]['prop_id'] != 'normalize-chart-btn.n_clicks':
         return [], {'display': 'none'}, [], {'display': 'none'}
     
-    # Parse all inputs into a structured dictionary (复用现有逻辑)
-    portfolios = {}
-    portfolio_names_dict = {}
-    
-    # Get portfolio names
-    if hasattr(ctx, "states_list") and len(ctx.states_list) > 4:
-        for i, value in enumerate(portfolio_names):
-            if value is not None and value != "":
-                state_id = ctx.states_list[4][i]['id']
-                portfolio_id = state_id['portfolio_id']
-                portfolio_names_dict[portfolio_id] = value
-
-    # Process fund inputs
-    fund_inputs = [
-        (fund_names, 0),
-        (fund_shares, 1),
-        (fund_datas, 2),
-        (fund_codes, 3)
-    ]
-    
-    for arr, state_idx in fund_inputs:
-        if hasattr(ctx, "states_list") and len(ctx.states_list) > state_idx:
-            for i, value in enumerate(arr):
-                if value is None or value == "":
-                    continue
-                state_id = ctx.states_list[state_idx][i]['id']
-                input_type = state_id['type']
-                portfolio_id = state_id['portfolio_id']
-                fund_id = state_id['fund_id']
-                
-                if portfolio_id not in portfolios:
-                    portfolios[portfolio_id] = {
-                        'funds': {},
-                        'name': portfolio_names_dict.get(portfolio_id, f"组合 {len(portfolios) + 1}")
-                    }
-                if fund_id not in portfolios[portfolio_id]['funds']:
-                    portfolios[portfolio_id]['funds'][fund_id] = {}
-                portfolios[portfolio_id]['funds'][fund_id][input_type] = value
-                if portfolio_id in portfolio_names_dict:
-                    portfolios[portfolio_id]['name'] = portfolio_names_dict[portfolio_id]
+    # Parse all inputs into a structured dictionary
+    portfolios = parse_portfolio_state(ctx, fund_names, fund_shares, fund_datas, fund_codes, portfolio_names)
 
     # Process data for all portfolios and collect time ranges
     portfolio_data = []
     global_latest_start = None
     portfolio_nav_data = {}  # 存储净值数据用于分析
+    # 所有基金的数据先并发加载，再逐个组合处理
+    loaded_dfs = _load_all_fund_dfs(portfolios, require_share=True)
     
     for p_id, p_data in portfolios.items():
         portfolio_name = p_data.get('name')
         fund_dfs = []
-        fund_start_times = []  # 存储这个组合中每个基金的开始时间
         
         for fund_id, fund_data in p_data['funds'].items():
             share = fund_data.get('fund-share')
-            data_source = fund_data.get('fund-data')
-            fund_code = fund_data.get('fund-code')
-            
-            if not data_source or share is None:
-                continue
-                
-            df = None
-            # 处理不同的数据源 (复用现有逻辑)
-            if data_source.startswith('script:'):
-                script_name = data_source[7:]
-                if fund_code:
-                    df = execute_custom_script(script_name, fund_code)
-                    if df is not None and 'time' in df.columns:
-                        df['time'] = pd.to_datetime(df['time'])
-                        df = df.set_index('time')
-                        value_cols = [col for col in df.columns if df[col].dtype in ['float64', 'int64']]
-                        if value_cols:
-                            value_col = value_cols[0]
-                            # 不在这里归一化，稍后统一处理
-                            df.rename(columns={value_col: fund_id}, inplace=True)
-                            fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                            fund_start_times.append(df.index.min())
-            elif os.path.exists(data_source):
-                try:
-                    df = pd.read_csv(data_source)
-                    if 'time' in df.columns:
-                        value_col = next((col for col in df.columns if col.lower() != 'time'), None)
-                        if value_col:
-                            df['time'] = pd.to_datetime(df['time'])
-                            df = df.set_index('time')
-                            df.rename(columns={value_col: fund_id}, inplace=True)
-                            fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                            fund_start_times.append(df.index.min())
-                    elif 'FSRQ' in df.columns and 'DWJZ' in df.columns:
-                        df = df.rename(columns={'FSRQ': 'time', 'DWJZ': 'nav'})
-                        df['time'] = pd.to_datetime(df['time'])
-                        df = df.set_index('time')
-                        df = df.sort_index()
-                        df['nav'] = pd.to_numeric(df['nav'], errors='coerce')
-                        df = df.dropna()
-                        df.rename(columns={'nav': fund_id}, inplace=True)
-                        fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                        fund_start_times.append(df.index.min())
-                except Exception as e:
-                    safe_print("Error processing file {}: {}".format(data_source, str(e)))
-                    continue
+            df = loaded_dfs.get((p_id, fund_id))
+            if df is not None and not df.empty:
+                # 不在这里归一化，稍后统一处理；直接引用缓存中的数据，不为改列名复制一个 DataFrame
+                fund_dfs.append({'df': df, 'share': share, 'fund_id': fund_id})
         
-        if fund_dfs and fund_start_times:
+        if fund_dfs:
             # 在当前组合中找到最晚开始的基金时间（组合内最晚发售日）
-            portfolio_latest_start = max(fund_start_times)
+            # 各基金索引已按时间排序，第一个时间点即为开始时间
+            portfolio_latest_start = max(f['df'].index[0] for f in fund_dfs)
             
             # 更新全局最晚开始时间（所有组合中最晚的那个）
             if global_latest_start is None or portfolio_latest_start > global_latest_start:
@@ -387,11 +465,7 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
     if not portfolio_data or global_latest_start is None:
         return [], {'display': 'none'}
     
-    try:
-        start_date_str = global_latest_start.strftime('%Y-%m-%d')
-        safe_print("Smart normalization: Using latest start time {} as baseline".format(start_date_str))
-    except Exception as e:
-        safe_print("Smart normalization: Using latest start time as baseline (date formatting error: {})".format(str(e)))
+    log.debug("Smart normalization: Using latest start time %s as baseline", global_latest_start)
     
     # 基于全局最晚开始时间重新处理所有组合
     traces = []
@@ -400,37 +474,19 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
         portfolio_name = pdata['portfolio_name']
         portfolio_latest_start = pdata['portfolio_latest_start']
         
-        # 截取到全局最晚开始时间并归一化
-        normalized_fund_dfs = []
+        # 截取到全局最晚开始时间（这样确保所有组合都能在同一起点开始对比）
+        # 索引已按时间排序，二分查找起点后切片，不需要构造布尔掩码；
+        # 切片与缓存中的数据共享内存，归一化留到合成净值时并入权重完成
+        truncated_fund_dfs = []
         for fund in fund_dfs:
             df = fund['df']
-            fund_id = df.columns[0]
-            
-            # 截取到全局最晚开始时间（这样确保所有组合都能在同一起点开始对比）
-            truncated_df = df[df.index >= global_latest_start]
-            if not truncated_df.empty:
-                # 以全局最晚开始时间点的值为基准归一化
-                first_value = truncated_df[fund_id].iloc[0]
-                if first_value != 0:
-                    truncated_df = truncated_df.copy()
-                    truncated_df[fund_id] = truncated_df[fund_id] / first_value
-                normalized_fund_dfs.append({
-                    'df': truncated_df,
-                    'share': fund['share']
-                })
+            start_pos = df.index.searchsorted(global_latest_start, side='left')
+            if start_pos < len(df):
+                truncated_fund_dfs.append({'df': df.iloc[start_pos:], 'share': fund['share']})
         
-        if normalized_fund_dfs:
-            # 计算组合净值
-            combined_df = pd.concat([f['df'] for f in normalized_fund_dfs], axis=1)
-            combined_df = combined_df.sort_index()
-            combined_df.ffill(inplace=True)
-            combined_df.bfill(inplace=True)
-            
-            nav = pd.Series(0.0, index=combined_df.index)
-            for fund in normalized_fund_dfs:
-                fund_id = fund['df'].columns[0]
-                if fund_id in combined_df.columns and not combined_df[fund_id].isnull().all():
-                    nav += combined_df[fund_id] * (fund['share'] / 100.0)
+        if truncated_fund_dfs:
+            # 以全局最晚开始时间点的值为基准归一化并计算组合净值
+            nav = _portfolio_nav(truncated_fund_dfs, normalize=True)
             
             if not nav.empty and nav.notna().any():
                 # 添加标记表示这是智能归一化的结果，同时显示该组合内的最晚发售日期
@@ -445,38 +501,22 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
                         chart_name = f"{portfolio_name} (内部最晚: {portfolio_date_str}, 归一化至: {global_date_str})"
                 except Exception as e:
                     chart_name = f"{portfolio_name} (智能归一化)"
-                traces.append(go.Scatter(
-                    x=nav.index,
-                    y=(nav - 1) * 100,  # 转换为百分比收益率
-                    mode='lines',
-                    name=chart_name,
-                    line=dict(dash='dot' if len(traces) % 2 == 1 else 'solid'),  # 交替使用虚线和实线
-                    hovertemplate='<b>%{fullData.name}</b><br>' +
-                                  '时间: %{x}<br>' +
-                                  '收益率: %{y:.2f}%<br>' +
-                                  '<extra></extra>'
-                ))
+                traces.append({
+                    'type': 'scatter',
+                    'x': nav.index.to_numpy(),
+                    'y': _typed_array((nav.to_numpy() - 1.0) * 100.0),  # 转换为百分比收益率，直接在数组上计算
+                    'mode': 'lines',
+                    'name': chart_name,
+                    'line': {'dash': 'dot' if len(traces) % 2 == 1 else 'solid'},  # 交替使用虚线和实线
+                    'hovertemplate': _HOVER_TEMPLATE
+                })
                 
                 # 保存净值数据用于投资分析
-                try:
-                    safe_print("Smart normalization saved portfolio nav data: {}, data points: {}".format(portfolio_name, len(nav)))
-                except Exception:
-                    pass
+                log.debug("Smart normalization saved portfolio nav data: %s, data points: %d", portfolio_name, len(nav))
                 portfolio_nav_data[portfolio_name] = nav
     
     # Create Figure
-    figure = go.Figure(
-        data=traces,
-        layout=go.Layout(
-            title='智能归一化组合对比 - 基于最晚开始时间',
-            xaxis={'title': '时间'},
-            yaxis={'title': '收益率 (%)', 'tickformat': '.1f'},
-            hovermode='x unified',
-            template='plotly_white',
-            legend_title_text='组合',
-            margin=dict(l=40, r=40, t=60, b=40)
-        )
-    )
+    figure = {'data': traces, 'layout': _NORMALIZED_LAYOUT}
 
     graph_component = dcc.Graph(
         figure=figure,
@@ -486,45 +526,34 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
     # Calculate investment analytics for normalized data
     analytics_data = []
     if portfolio_nav_data:
-        try:
-            safe_print("Smart normalization: Starting investment analysis, portfolios:", len(portfolio_nav_data))
-        except Exception:
-            pass
+        log.debug("Smart normalization: Starting investment analysis, portfolios: %d", len(portfolio_nav_data))
         # 统一用所有组合净值序列的交集时间区间
         nav_series_list = list(portfolio_nav_data.values())
         if nav_series_list:
             # 取所有净值序列的时间索引交集
-            common_index = nav_series_list[0].index
-            for s in nav_series_list[1:]:
-                common_index = common_index.intersection(s.index)
-            start_str = common_index.min().strftime('%Y-%m-%d')
-            end_str = common_index.max().strftime('%Y-%m-%d')
-            safe_print("统一分析区间: {} ~ {}, 共 {} 天".format(start_str, end_str, len(common_index)))
+            # 各序列索引已排序，直接在 datetime64 数组上求交集，结果同样有序
+            indexes = [s.index for s in nav_series_list]
+            all_unique = all(index.is_unique for index in indexes)
+            common_index = pd.DatetimeIndex(functools.reduce(
+                lambda a, b: np.intersect1d(a, b, assume_unique=all_unique),
+                (index.to_numpy() for index in indexes)
+            ))
+            if len(common_index):
+                log.debug("统一分析区间: %s ~ %s, 共 %d 天", common_index[0], common_index[-1], len(common_index))
             for portfolio_name, nav_series in portfolio_nav_data.items():
-                nav_common = nav_series.loc[common_index]
-                safe_print("计算归一化组合: {}, 数据点: {}".format(portfolio_name, len(nav_common)))
+                # 有序索引上二分查找交集日期的位置，按位置取值
+                nav_common = nav_series.iloc[nav_series.index.searchsorted(common_index)]
+                log.debug("计算归一化组合: %s, 数据点: %d", portfolio_name, len(nav_common))
                 metrics = calculate_investment_metrics(nav_common, "{} (归一化)".format(portfolio_name))
                 if metrics:
-                    try:
-                        safe_print("{} 归一化分析完成".format(portfolio_name))
-                    except Exception:
-                        pass
+                    log.debug("%s 归一化分析完成", portfolio_name)
                     analytics_data.append(metrics)
                 else:
-                    try:
-                        safe_print("{} 归一化分析失败".format(portfolio_name))
-                    except Exception:
-                        pass
+                    log.debug("%s 归一化分析失败", portfolio_name)
     else:
-        try:
-            safe_print("Smart normalization: No portfolio nav data for analysis")
-        except Exception:
-            pass
+        log.debug("Smart normalization: No portfolio nav data for analysis")
     
-    try:
-        safe_print("Smart normalization investment analysis results: {} portfolios".format(len(analytics_data)))
-    except Exception:
-        pass
+    log.debug("Smart normalization investment analysis results: %d portfolios", len(analytics_data))
     
     # Create analytics table
     analytics_component = create_analytics_table(analytics_data) if analytics_data else html.Div("暂无投资分析数据", style={'textAlign': 'center', 'color': 'gray', 'padding': '20px'})
@@ -543,42 +572,10 @@ def generate_normalized_chart(n_clicks, fund_names, fund_shares, fund_datas, fun
 )
 def toggle_fund_code_visibility(data_sources):
     """根据数据源选择显示或隐藏基金代码输入框和提示文本"""
-    input_styles = []
-    hint_styles = []
-    
-    for data_source in data_sources:
-        if data_source and data_source.startswith('script:'):
-            # 如果选择的是脚本，显示参数输入框和提示
-            input_style = {
-                **INPUT_STYLE, 
-                'width': '200px',
-                'marginRight': '8px',
-                'display': 'block'
-            }
-            hint_style = {
-                'fontSize': '12px',
-                'color': COLORS['secondary'],
-                'fontStyle': 'italic',
-                'display': 'inline'
-            }
-        else:
-            # 否则隐藏参数输入框和提示
-            input_style = {
-                **INPUT_STYLE, 
-                'width': '200px',
-                'marginRight': '8px',
-                'display': 'none'
-            }
-            hint_style = {
-                'fontSize': '12px',
-                'color': COLORS['secondary'],
-                'fontStyle': 'italic',
-                'display': 'none'
-            }
-        input_styles.append(input_style)
-        hint_styles.append(hint_style)
-    
-    return input_styles, hint_styles
+    # 选择脚本时显示参数输入框和提示，否则隐藏
+    visible = [bool(data_source and data_source.startswith('script:')) for data_source in data_sources]
+    return ([_CODE_VISIBLE_STYLE if v else _CODE_HIDDEN_STYLE for v in visible],
+            [_HINT_VISIBLE_STYLE if v else _HINT_HIDDEN_STYLE for v in visible])
 
 # Callback to add a new portfolio card
 @app.callback(
@@ -597,14 +594,15 @@ def manage_portfolios(add_clicks, remove_clicks, children):
     
     # Handle add portfolio button
     if triggered_id_str == 'add-portfolio-btn':
-        new_portfolio_id = str(uuid.uuid4())
+        new_portfolio_id = new_id()
         new_card = create_portfolio_card(new_portfolio_id, add_clicks)
         children.append(new_card)
         return children
     
     # Handle remove portfolio button
     try:
-        triggered_id = eval(triggered_id_str)
+        # 模式匹配组件的 ID 由 Dash 序列化为 JSON 字符串
+        triggered_id = json.loads(triggered_id_str)
         if triggered_id['type'] == 'remove-portfolio-btn':
             portfolio_id_to_remove = triggered_id['portfolio_id']
             
@@ -614,7 +612,7 @@ def manage_portfolios(add_clicks, remove_clicks, children):
                 if child['props']['id']['portfolio_id'] != portfolio_id_to_remove
             ]
             return updated_children
-    except:
+    except (json.JSONDecodeError, KeyError, TypeError):
         # If parsing fails, return original children
         pass
     
@@ -634,19 +632,24 @@ def manage_funds(add_clicks, remove_clicks, fund_containers):
     # 处理初始化情况
     if not ctx.triggered or ctx.triggered[0]['prop_id'] == '.':
         # 初始化时，为每个空的容器添加基金条目
+        data_source_options = None
         for i, container in enumerate(fund_containers):
             if container is None or len(container) == 0:
                 # 获取对应的 portfolio_id
                 state_id = ctx.states_list[0][i]['id']
                 portfolio_id = state_id['portfolio_id']
                 
+                # 所有新条目共用同一份数据源选项，只扫描一次目录
+                if data_source_options is None:
+                    data_source_options = get_data_source_options()
+                
                 # 为每个组合创建初始基金条目
-                new_fund_id = str(uuid.uuid4())
-                fund_containers[i] = [create_fund_entry(portfolio_id, new_fund_id)]
+                new_fund_id = new_id()
+                fund_containers[i] = [create_fund_entry(portfolio_id, new_fund_id, data_source_options)]
         return fund_containers
 
     triggered_id_str = ctx.triggered[0]['prop_id'].split('.')[0]
-    triggered_id = eval(triggered_id_str)
+    triggered_id = json.loads(triggered_id_str)
     portfolio_id = triggered_id['portfolio_id']
 
     # Find the index of the container that was triggered
@@ -666,7 +669,7 @@ def manage_funds(add_clicks, remove_clicks, fund_containers):
         # The n_clicks for the button that was just clicked will be greater than 0.
         # This check is important to prevent adding a fund on app start.
         if sum(c for c in add_clicks if c is not None) > 0:
-            new_fund_id = str(uuid.uuid4())
+            new_fund_id = new_id()
             new_fund_ui = create_fund_entry(portfolio_id, new_fund_id)
             # Ensure the container is a list
             if fund_containers[triggered_index] is None:
@@ -689,6 +692,72 @@ def manage_funds(add_clicks, remove_clicks, fund_containers):
     return fund_containers
 
 
+# 上一次 update_graph_and_feedback 的图表与分析输出，以曲线和净值数据的指纹判断能否复用
+# 指纹与输出作为一个元组整体替换，多线程下不会读到不匹配的一对
+_last_graph_outputs = {'last': None}
+
+
+def _graph_fingerprint(traces, portfolio_nav_data):
+    """
+    计算曲线名称与各组合净值（时间与数值）的指纹
+    :param traces: 曲线字典列表
+    :param portfolio_nav_data: {组合键: 净值 Series}
+    :return: 16 字节摘要
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for trace in traces:
+        digest.update(trace['name'].encode('utf-8'))
+    for key, nav in portfolio_nav_data.items():
+        digest.update(key.encode('utf-8'))
+        digest.update(nav.index.to_numpy().view('i8'))
+        digest.update(nav.to_numpy())
+    return digest.digest()
+
+
+def _build_graph_outputs(traces, portfolio_nav_data):
+    """
+    生成 update_graph_and_feedback 的图表组件和投资分析表格
+    :param traces: 曲线字典列表
+    :param portfolio_nav_data: {组合键: 净值 Series}
+    :return: (图表组件, 图表样式, 分析区域 children, 分析区域样式)
+    """
+    from modules.analytics import calculate_investment_metrics, create_analytics_table
+    
+    # Create Figure and wrap it in dcc.Graph
+    figure = {'data': traces, 'layout': _BASE_LAYOUT}
+
+    # Wrap the figure in a dcc.Graph component
+    graph_component = dcc.Graph(
+        figure=figure,
+        style={'height': '600px'}
+    ) if traces else []
+
+    # Calculate investment analytics
+    analytics_data = []
+    log.debug("调试：portfolio_nav_data 包含组合数: %d", len(portfolio_nav_data))
+    if portfolio_nav_data:
+        log.debug("开始计算投资分析，共有组合数: %d", len(portfolio_nav_data))
+        for unique_portfolio_key, nav_series in portfolio_nav_data.items():
+            log.debug("计算组合: %s, 数据点: %d", unique_portfolio_key, len(nav_series))
+            metrics = calculate_investment_metrics(nav_series, unique_portfolio_key)
+            if metrics:
+                log.debug("%s 分析完成", unique_portfolio_key)
+                analytics_data.append(metrics)
+            else:
+                log.debug("%s 分析失败", unique_portfolio_key)
+    else:
+        log.debug("没有组合净值数据用于分析")
+    
+    log.debug("投资分析结果：%d 个组合", len(analytics_data))
+    
+    # Create analytics table
+    analytics_component = create_analytics_table(analytics_data) if analytics_data else html.Div("暂无投资分析数据", style={'textAlign': 'center', 'color': 'gray', 'padding': '20px'})
+    analytics_style = {'display': 'block', 'maxWidth': '1200px', 'margin': '20px auto 0 auto'}
+
+    graph_style = {'display': 'block' if traces else 'none'}
+    return graph_component, graph_style, [analytics_component], analytics_style
+
+
 @app.callback(
     Output('graph-container', 'children'),
     Output('graph-container', 'style'),
@@ -705,6 +774,7 @@ def manage_funds(add_clicks, remove_clicks, fund_containers):
 )
 def update_graph_and_feedback(n_clicks, fund_names, fund_shares, fund_datas, fund_codes, portfolio_names, portfolios_container):
     import dash
+    from modules.analytics import align_time_series_data
     ctx = dash.callback_context
     if not ctx.triggered or n_clicks is None or n_clicks == 0:
         # 初始或未点击时隐藏图表和分析
@@ -712,128 +782,47 @@ def update_graph_and_feedback(n_clicks, fund_names, fund_shares, fund_datas, fun
 
     # --- 1. Parse all inputs into a structured dictionary ---
 
-    portfolios = {}
-    portfolio_names_dict = {}
-    # 修复：通过 ctx.states_list 获取 portfolio_id
-    if hasattr(ctx, "states_list") and len(ctx.states_list) > 4:
-        for i, value in enumerate(portfolio_names):
-            if value is not None and value != "":
-                state_id = ctx.states_list[4][i]['id']
-                portfolio_id = state_id['portfolio_id']
-                portfolio_names_dict[portfolio_id] = value
-
-    # 修复：通过 states_list 获取 fund 输入的 id 信息
-    fund_inputs = [
-        (fund_names, 0),
-        (fund_shares, 1),
-        (fund_datas, 2),
-        (fund_codes, 3)
-    ]
-    for arr, state_idx in fund_inputs:
-        if hasattr(ctx, "states_list") and len(ctx.states_list) > state_idx:
-            for i, value in enumerate(arr):
-                if value is None or value == "":
-                    continue
-                state_id = ctx.states_list[state_idx][i]['id']
-                input_type = state_id['type']
-                portfolio_id = state_id['portfolio_id']
-                fund_id = state_id['fund_id']
-                # 赋值
-                if portfolio_id not in portfolios:
-                    portfolios[portfolio_id] = {
-                        'funds': {},
-                        'name': portfolio_names_dict.get(portfolio_id, f"组合 {len(portfolios) + 1}")
-                    }
-                if fund_id not in portfolios[portfolio_id]['funds']:
-                    portfolios[portfolio_id]['funds'][fund_id] = {}
-                portfolios[portfolio_id]['funds'][fund_id][input_type] = value
-                if portfolio_id in portfolio_names_dict:
-                    portfolios[portfolio_id]['name'] = portfolio_names_dict[portfolio_id]
+    portfolios = parse_portfolio_state(ctx, fund_names, fund_shares, fund_datas, fund_codes, portfolio_names)
 
     # --- 2. Process data and calculate portfolio values ---
     traces = []
-    feedback_messages = {}
+    # 每个组合的反馈默认为空字符串，之后只需在有提示时写入
+    feedback_messages = dict.fromkeys(portfolios, "")
     portfolio_nav_data = {}  # 存储每个组合的净值数据用于分析
+    # 所有基金的数据先并发加载，再逐个组合处理；未填写份额的基金不参与计算，无需加载
+    loaded_dfs = _load_all_fund_dfs(portfolios, require_share=True)
     
     for p_id, p_data in portfolios.items():
         total_share = 0
+        missing_share = 0
         fund_dfs = []
         portfolio_name = p_data.get('name')
-        unique_portfolio_key = f"{portfolio_name} [{p_id[:8]}]"
+        unique_portfolio_key = f"{portfolio_name} [{p_id}]"
         for fund_id, fund_data in p_data['funds'].items():
             share = fund_data.get('fund-share')
-            data_source = fund_data.get('fund-data')
-            fund_code = fund_data.get('fund-code')
-            fund_name = fund_data.get('fund-name') or f"基金-{fund_id[:4]}"
-            if share is not None:
-                total_share += share
-            df = None
-            # 处理不同的数据源
-            if data_source:
-                if data_source.startswith('script:'):
-                    script_name = data_source[7:]
-                    if fund_code:
-                        safe_print("正在执行脚本 {} 获取基金 {} 数据...".format(script_name, fund_code))
-                        df = execute_custom_script(script_name, fund_code)
-                        if df is not None and 'time' in df.columns:
-                            df['time'] = pd.to_datetime(df['time'])
-                            df = df.set_index('time')
-                            value_cols = [col for col in df.columns if df[col].dtype in ['float64', 'int64']]
-                            if value_cols:
-                                value_col = value_cols[0]
-                                # 不在这里归一化，保留原始数据
-                                df.rename(columns={value_col: fund_id}, inplace=True)
-                                fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                                safe_print("脚本数据处理成功: {} 条记录".format(len(df)))
-                            else:
-                                safe_print("脚本返回的数据中没有找到数值列")
-                        else:
-                            safe_print("脚本 {} 执行失败或返回数据格式不正确".format(script_name))
-                    else:
-                        safe_print("使用脚本 {} 但未提供基金代码".format(script_name))
-                elif os.path.exists(data_source):
-                    try:
-                        df = pd.read_csv(data_source)
-                        if 'time' in df.columns:
-                            value_col = next((col for col in df.columns if col.lower() != 'time'), None)
-                            if value_col:
-                                df['time'] = pd.to_datetime(df['time'])
-                                df = df.set_index('time')
-                                # 不在这里归一化，保留原始数据
-                                df.rename(columns={value_col: fund_id}, inplace=True)
-                                fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                        elif 'FSRQ' in df.columns and 'DWJZ' in df.columns:
-                            df = df.rename(columns={'FSRQ': 'time', 'DWJZ': 'nav'})
-                            df['time'] = pd.to_datetime(df['time'])
-                            df = df.set_index('time')
-                            df = df.sort_index()
-                            df['nav'] = pd.to_numeric(df['nav'], errors='coerce')
-                            df = df.dropna()
-                            # 不在这里归一化，保留原始数据
-                            df.rename(columns={'nav': fund_id}, inplace=True)
-                            fund_dfs.append({'df': df[[fund_id]], 'share': share})
-                    except Exception as e:
-                        safe_print("Error processing file {}: {}".format(data_source, str(e)))
-                        continue
+            if share is None:
+                # 份额统一在这里校验，_portfolio_nav 只会收到有份额的基金
+                if fund_data.get('fund-data'):
+                    missing_share += 1
+                continue
+            total_share += share
+            df = loaded_dfs.get((p_id, fund_id))
+            if df is not None:
+                # 不在这里归一化，保留原始数据
+                fund_dfs.append({'df': df, 'share': share, 'fund_id': fund_id})
+        messages = []
         if round(total_share, 2) != 100 and total_share > 0:
-            feedback_messages[p_id] = "份额总和为 {}%, 不等于 100%！".format(total_share)
-        else:
-            feedback_messages[p_id] = ""
+            messages.append("份额总和为 {}%, 不等于 100%！".format(total_share))
+        if missing_share:
+            messages.append("{} 只基金未填写份额，已忽略".format(missing_share))
+        feedback_messages[p_id] = " | ".join(messages)
         
         if fund_dfs:
             # 新增：时间区间对齐处理
             aligned_fund_dfs, time_stats = align_time_series_data(fund_dfs, portfolio_name)
             
             if aligned_fund_dfs:
-                combined_df = pd.concat([f['df'] for f in aligned_fund_dfs], axis=1)
-                combined_df = combined_df.sort_index()
-                combined_df.ffill(inplace=True)
-                combined_df.bfill(inplace=True)
-                nav = pd.Series(0.0, index=combined_df.index)
-                for fund in aligned_fund_dfs:
-                    fund_id = fund['df'].columns[0]
-                    if fund_id in combined_df.columns and not combined_df[fund_id].isnull().all():
-                        nav += combined_df[fund_id] * (fund['share'] / 100.0)
+                nav = _portfolio_nav(aligned_fund_dfs)
                 if not nav.empty and nav.notna().any():
                     # 生成图表名称，包含时间信息
                     chart_name = portfolio_name
@@ -841,22 +830,17 @@ def update_graph_and_feedback(n_clicks, fund_names, fund_shares, fund_datas, fun
                         start_date = time_stats['latest_start'].strftime('%Y-%m-%d')
                         chart_name += f" (对齐至 {start_date})"
                     
-                    traces.append(go.Scatter(
-                        x=nav.index,
-                        y=(nav - 1) * 100,  # 转换为百分比收益率
-                        mode='lines',
-                        name=chart_name,
-                        hovertemplate='<b>%{fullData.name}</b><br>' +
-                                      '时间: %{x}<br>' +
-                                      '收益率: %{y:.2f}%<br>' +
-                                      '<extra></extra>'
-                    ))
+                    traces.append({
+                        'type': 'scatter',
+                        'x': nav.index.to_numpy(),
+                        'y': _typed_array((nav.to_numpy() - 1.0) * 100.0),  # 转换为百分比收益率，直接在数组上计算
+                        'mode': 'lines',
+                        'name': chart_name,
+                        'hovertemplate': _HOVER_TEMPLATE
+                    })
                     
                     # 保存净值数据用于投资分析
-                    try:
-                        safe_print("保存组合净值数据: {}, 数据点: {}".format(unique_portfolio_key, len(nav)))
-                    except Exception:
-                        pass
+                    log.debug("保存组合净值数据: %s, 数据点: %d", unique_portfolio_key, len(nav))
                     portfolio_nav_data[unique_portfolio_key] = nav
                     
                     # 更新反馈信息，包含时间对齐状态
@@ -867,71 +851,15 @@ def update_graph_and_feedback(n_clicks, fund_names, fund_shares, fund_datas, fun
                         else:
                             feedback_messages[p_id] = alignment_info
     # --- 3. Prepare outputs ---
-    # Create Figure and wrap it in dcc.Graph
-    figure = go.Figure(
-        data=traces,
-        layout=go.Layout(
-            xaxis={'title': '时间'},
-            yaxis={'title': '收益率 (%)', 'tickformat': '.1f'},
-            hovermode='x unified',
-            template='plotly_white',
-            legend_title_text='组合',
-            margin=dict(l=40, r=40, t=40, b=40)
-        )
-    )
-
-    # Wrap the figure in a dcc.Graph component
-    graph_component = dcc.Graph(
-        figure=figure,
-        style={'height': '600px'}
-    ) if traces else []
-
-    # --- 4. Calculate investment analytics ---
-    analytics_data = []
-    try:
-        safe_print("调试：portfolio_nav_data 包含组合数:", len(portfolio_nav_data))
-    except Exception:
-        pass
-    if portfolio_nav_data:
-        try:
-            safe_print("开始计算投资分析，共有组合数:", len(portfolio_nav_data))
-        except Exception:
-            pass
-        for unique_portfolio_key, nav_series in portfolio_nav_data.items():
-            try:
-                safe_print("计算组合: {}, 数据点: {}".format(unique_portfolio_key, len(nav_series)))
-            except Exception:
-                pass
-            metrics = calculate_investment_metrics(nav_series, unique_portfolio_key)
-            if metrics:
-                try:
-                    safe_print("{} 分析完成".format(unique_portfolio_key))
-                except Exception:
-                    pass
-                analytics_data.append(metrics)
-            else:
-                try:
-                    safe_print("{} 分析失败".format(unique_portfolio_key))
-                except Exception:
-                    pass
+    # 曲线与净值数据都没有变化时（例如只改了无关输入再次点击），直接复用上次的图表与分析表格
+    fingerprint = _graph_fingerprint(traces, portfolio_nav_data)
+    last = _last_graph_outputs['last']
+    if last is not None and last[0] == fingerprint:
+        graph_outputs = last[1]
     else:
-        try:
-            safe_print("没有组合净值数据用于分析")
-        except Exception:
-            pass
-        try:
-            safe_print("调试：portfolio_nav_data 详情:", str(portfolio_nav_data))
-        except Exception:
-            pass
-    
-    try:
-        safe_print(f"投资分析结果：{len(analytics_data)} 个组合")
-    except Exception:
-        pass
-    
-    # Create analytics table
-    analytics_component = create_analytics_table(analytics_data) if analytics_data else html.Div("暂无投资分析数据", style={'textAlign': 'center', 'color': 'gray', 'padding': '20px'})
-    analytics_style = {'display': 'block', 'maxWidth': '1200px', 'margin': '20px auto 0 auto'}
+        graph_outputs = _build_graph_outputs(traces, portfolio_nav_data)
+        _last_graph_outputs['last'] = (fingerprint, graph_outputs)
+    graph_component, graph_style, analytics_children, analytics_style = graph_outputs
 
     # Match feedback messages to the correct output components
     output_feedback_list = []
@@ -939,35 +867,12 @@ def update_graph_and_feedback(n_clicks, fund_names, fund_shares, fund_datas, fun
     for p_id in all_feedback_ids:
         output_feedback_list.append(feedback_messages.get(p_id, ""))
 
-    graph_style = {'display': 'block' if traces else 'none'}
-
     # 直接将分析内容作为 analytics-section 的 children 输出
-    return graph_component, graph_style, [analytics_component], analytics_style, output_feedback_list
+    return graph_component, graph_style, analytics_children, analytics_style, output_feedback_list
 
 
 # --- Custom CSS Styles ---
-app.index_string = f'''
-<!DOCTYPE html>
-<html>
-    <head>
-        {{%metas%}}
-        <title>{{%title%}}</title>
-        {{%favicon%}}
-        {{%css%}}
-        <style>
-            {CSS_STYLES}
-        </style>
-    </head>
-    <body>
-        {{%app_entry%}}
-        <footer>
-            {{%config%}}
-            {{%scripts%}}
-            {{%renderer%}}
-        </footer>
-    </body>
-</html>
-'''
+# 自定义样式位于 assets/overlay.css，Dash 会自动以 <link> 方式加载
 
 
 # Callback to auto-refresh portfolio display after saving data
@@ -988,4 +893,6 @@ def refresh_portfolios_after_save(save_clicks, current_children):
 
 
 if __name__ == '__main__':
+    if os.environ.get('OVERLAY_DEBUG') == '1':
+        logging.basicConfig(level=logging.DEBUG)
     app.run(debug=True, port=8051)